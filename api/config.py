@@ -8,10 +8,62 @@ class Config(BaseSettings):
 
     REDIS_URL: str = "redis://localhost"
     CACHE_OSM_EXPIRY: int = 3600 * 24  # 24 hours
+    # Cached POIs older than this are still served, and refreshed in the background
+    CACHE_OSM_FRESH: int = 3600 * 12  # 12 hours
+    CACHE_OSM_REFRESH_LEASE: int = 300  # seconds
+    # Lease of the lock of a missing tile, which a single worker fetches (seconds)
+    CACHE_OSM_FILL_LEASE: int = 120
     # Geneva and Leman areas by default
     CACHE_OSM_AREAS: str = "[[5.829620,46.055305,6.420135,46.425730],[6.252594,46.293045,7.027130,46.620381]]"
+    # POIs are cached by slippy map tiles at this zoom level (~6.5 km wide at zoom 12 in Switzerland)
+    CACHE_OSM_TILE_ZOOM: int = 12
+    # Delay between checks of the in-memory POI indexes against the cache (seconds)
+    CACHE_OSM_INDEX_CHECK: float = 5.0
+    # Memory size of the decoded POI tiles kept by each worker (bytes)
+    CACHE_OSM_LRU_BYTES: int = 256 * 1024 * 1024
+    # Number of (area, category) pairs fetched concurrently when building the cache
+    CACHE_OSM_BUILD_CONCURRENCY: int = 4
+    CACHE_OSM_JOB_EXPIRY: int = 3600 * 24 * 7  # 7 days
+    # Lease of the lock of a running cache job, renewed while it runs (seconds)
+    CACHE_OSM_JOB_LEASE: int = 60
+
+    CACHE_ISOCHRONES_EXPIRY: int = 3600 * 24  # 24 hours
+    # Origins are snapped to a grid of this size (meters)
+    CACHE_ISOCHRONES_GRID: float = 50.0
+    # Departure times are bucketed by slots of this size (minutes)
+    CACHE_ISOCHRONES_SLOT: int = 15
 
     OTP_URL: str = "https://lasur-otp.epfl.ch"
+    OTP_TIMEOUT: float = 60.0  # seconds
+    # Maximum number of concurrent OTP calls, also the size of their thread pool
+    OTP_MAX_CONNECTIONS: int = 16
+    # Fail fast after this number of consecutive failures, retry after the reset delay (seconds)
+    OTP_CIRCUIT_FAILURES: int = 5
+    OTP_CIRCUIT_RESET: float = 30.0
+    OTP_MODES_EXPIRY: int = 3600  # 1 hour
+    # Share identical concurrent computations across workers (in addition to within a worker)
+    ISOCHRONES_SINGLE_FLIGHT_REDIS: bool = False
+    ISOCHRONES_SINGLE_FLIGHT_EXPIRY: int = 30  # seconds
+    # Maximum number of concurrent OTP calls for a batch of origins
+    ISOCHRONES_BATCH_CONCURRENCY: int = 8
+
+    # Snapshot of the typology datasets, see api.service.modal_typo
+    TYPO_SNAPSHOT_DIR: str = "data/typo_modal"
+    # Number of memoized typology results (geo and typo), in each process
+    TYPO_CACHE_SIZE: int = 4096
+    # Number of survey rows scored per task of the process pool
+    TYPO_BULK_CHUNK: int = 500
+    # Delay before retrying to load the typology datasets, doubled after each failure up to the maximum (seconds)
+    TYPO_LOAD_RETRY: float = 5.0
+    TYPO_LOAD_RETRY_MAX: float = 300.0
+
+    # Validate the (large) GeoJSON responses against their response models, for debugging
+    DEBUG_VALIDATE_RESPONSES: bool = False
+
+    # Thread pool size for I/O-bound work (OSM, cache decoding), OTP calls have their own pool
+    EXECUTOR_IO_WORKERS: int = 16
+    # Process pool size for CPU-bound work (geometry, typology), 0 to use a thread
+    EXECUTOR_CPU_WORKERS: int = 2
 
 
 @lru_cache()
@@ -0,0 +1,111 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Dict
+from .config import config
+
+
+def _timed_call(func: Callable, *args, **kwargs) -> tuple[float, Any]:
+    """Run the function and report when it actually started (wall clock),
+    so that the time spent waiting in the queue can be measured, also across processes."""
+    started_at = time.time()
+    return started_at, func(*args, **kwargs)
+
+
+class PoolExecutor:
+    """Lazily created pool executor that keeps track of its queue depth and wait time."""
+
+    def __init__(self, name: str, factory: Callable[[], Executor], max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._factory = factory
+        self._executor = None
+        self.in_flight = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking function in the pool and await its result."""
+        if self._executor is None:
+            self._executor = self._factory()
+        loop = asyncio.get_running_loop()
+        submitted_at = time.time()
+        self.in_flight += 1
+        try:
+            started_at, result = await loop.run_in_executor(
+                self._executor, functools.partial(_timed_call, func, *args, **kwargs))
+            wait = max(started_at - submitted_at, 0.0)
+            self.completed += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            return result
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict:
+        """Get the pool size, queue depth and wait time statistics."""
+        return {
+            "workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "queue_depth": max(self.in_flight - self.max_workers, 0),
+            "completed": self.completed,
+            "avg_wait_sec": self.total_wait / self.completed if self.completed else 0.0,
+            "max_wait_sec": self.max_wait,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# I/O-bound work: OSM requests, cache decoding, datasets loading
+io_executor = PoolExecutor(
+    "io",
+    lambda: ThreadPoolExecutor(max_workers=config.EXECUTOR_IO_WORKERS,
+                               thread_name_prefix="io"),
+    config.EXECUTOR_IO_WORKERS)
+
+# OTP requests, in their own pool so that a slow OTP server cannot hold the threads
+# of the other I/O-bound work (its calls are bounded by OTP_MAX_CONNECTIONS)
+otp_executor = PoolExecutor(
+    "otp",
+    lambda: ThreadPoolExecutor(max_workers=config.OTP_MAX_CONNECTIONS,
+                               thread_name_prefix="otp"),
+    config.OTP_MAX_CONNECTIONS)
+
+# CPU-bound work: geometry and typology computations
+# (falls back to threads when no worker process is configured)
+cpu_executor = PoolExecutor(
+    "cpu",
+    lambda: ProcessPoolExecutor(max_workers=config.EXECUTOR_CPU_WORKERS)
+    if config.EXECUTOR_CPU_WORKERS > 0
+    else ThreadPoolExecutor(max_workers=1, thread_name_prefix="cpu"),
+    max(config.EXECUTOR_CPU_WORKERS, 1))
+
+
+async def run_io(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking I/O-bound function off the event loop."""
+    return await io_executor.run(func, *args, **kwargs)
+
+
+async def run_otp(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking OTP call off the event loop."""
+    return await otp_executor.run(func, *args, **kwargs)
+
+
+async def run_cpu(func: Callable, *args, **kwargs) -> Any:
+    """Run a CPU-bound function off the event loop.
+    The function and its arguments must be picklable."""
+    return await cpu_executor.run(func, *args, **kwargs)
+
+
+def get_executors_stats() -> Dict:
+    return {executor.name: executor.stats() for executor in (io_executor, otp_executor, cpu_executor)}
+
+
+def shutdown_executors() -> None:
+    for executor in (io_executor, otp_executor, cpu_executor):
+        executor.shutdown()
@@ -1,14 +1,73 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict
 from fastapi import FastAPI, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from logging import basicConfig, INFO, DEBUG
 from pydantic import BaseModel
 from .views.modal_typo import router as modal_typo_router
 from .views.auth import router as auth_router
 from .views.isochrones import router as isochrones_router
+from .executor import get_executors_stats, run_io, shutdown_executors
+from .service.otp import otp
+from .cache import redis
+from .service.pois import PoisService, listen_invalidations, stop_cache_jobs
+from .service.modal_typo import get_service as get_typo_service, is_ready as is_typo_ready
+from .config import config
 
 basicConfig(level=DEBUG)
 
-app = FastAPI()
+
+def preload() -> None:
+    """Load the shared data before the server forks its workers (see gunicorn.conf.py),
+    so that the workers share its memory pages copy-on-write."""
+    try:
+        get_typo_service()
+    except Exception as e:
+        # the workers retry, see load_datasets
+        logging.error(e, exc_info=True)
+    asyncio.run(preload_pois())
+    # the workers must not inherit the threads and connections of this process
+    shutdown_executors()
+
+
+async def preload_pois() -> None:
+    try:
+        await PoisService().load_indexes()
+    except Exception as e:
+        logging.error(e, exc_info=True)
+    finally:
+        await redis.connection_pool.disconnect()
+
+
+async def load_datasets() -> None:
+    """Load the typology datasets, retrying with an exponential backoff until they are loaded."""
+    delay = config.TYPO_LOAD_RETRY
+    while True:
+        try:
+            await run_io(get_typo_service)
+            return
+        except Exception as e:
+            logging.error(f"Typology datasets could not be loaded, retrying in {delay:g} s: {e}", exc_info=True)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, config.TYPO_LOAD_RETRY_MAX)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    listener = asyncio.create_task(listen_invalidations())
+    # the typology endpoints are unavailable until the datasets are loaded
+    loader = asyncio.create_task(load_datasets())
+    yield
+    loader.cancel()
+    listener.cancel()
+    # the interrupted cache jobs can be resumed by another worker
+    await stop_cache_jobs()
+    shutdown_executors()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = ["*"]
 
@@ -42,6 +101,86 @@ async def get_health(
     """
     return HealthCheck(status="OK")
 
+
+class ReadinessCheck(BaseModel):
+    """Response model of the readiness probe, with the state of each dependency."""
+    status: str = "OK"
+    checks: Dict[str, bool] = {}
+
+
+@app.get(
+    "/livez",
+    tags=["Healthcheck"],
+    summary="Perform a liveness check",
+    response_description="Return HTTP Status Code 200 (OK) while the worker is responsive",
+    status_code=status.HTTP_200_OK,
+    response_model=HealthCheck,
+)
+async def get_liveness(
+) -> HealthCheck:
+    """
+    Endpoint for kubernetes liveness probes: the worker serves requests.
+    """
+    return HealthCheck(status="OK")
+
+
+@app.get(
+    "/readyz",
+    tags=["Healthcheck"],
+    summary="Perform a readiness check",
+    response_description="Return HTTP Status Code 200 (OK) when ready to serve all requests, else 503",
+    status_code=status.HTTP_200_OK,
+    response_model=ReadinessCheck,
+)
+async def get_readiness(
+) -> ReadinessCheck:
+    """
+    Endpoint for kubernetes readiness probes: the typology datasets are loaded
+    and Redis is reachable.
+    """
+    checks = {"typology": is_typo_ready()}
+    try:
+        checks["redis"] = bool(await redis.ping())
+    except Exception as e:
+        logging.error(e, exc_info=True)
+        checks["redis"] = False
+    if all(checks.values()):
+        return ReadinessCheck(status="OK", checks=checks)
+    return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        content=ReadinessCheck(status="Unavailable", checks=checks).model_dump())
+
+
+@app.get(
+    "/healthz/executors",
+    tags=["Healthcheck"],
+    summary="Get the executors statistics",
+    response_description="Return the pool size, queue depth and wait time of each executor",
+    status_code=status.HTTP_200_OK,
+    response_model=Dict,
+)
+async def get_executors(
+) -> Dict:
+    """
+    Endpoint to monitor the thread and process pools running the blocking work.
+    """
+    return get_executors_stats()
+
+
+@app.get(
+    "/healthz/otp",
+    tags=["Healthcheck"],
+    summary="Get the OTP gateway state",
+    response_description="Return the circuit breaker state and the age of the cached modes",
+    status_code=status.HTTP_200_OK,
+    response_model=Dict,
+)
+async def get_otp(
+) -> Dict:
+    """
+    Endpoint to monitor the OTP gateway.
+    """
+    return otp.stats()
+
 app.include_router(
     auth_router,
     prefix="/auth",
@@ -30,7 +30,16 @@ class FeatureCollection(BaseModel):
     bbox: Optional[List[float]] = None
 
 
-class PoisData(BaseModel):
+class GeometryOptions(BaseModel):
+    simplify: Optional[float] = Field(
+        None, ge=0, le=0.05, description="Topology-preserving simplification tolerance (degrees)")
+    zoom: Optional[int] = Field(
+        None, ge=6, le=22, description="Target zoom level, simplifies to the size of one pixel (ignored if simplify is set)")
+    precision: Optional[int] = Field(
+        None, ge=3, le=10, description="Number of decimals of the coordinates")
+
+
+class PoisData(GeometryOptions):
     bbox: List[float] = Field(...,
                               description="Bounding box [minLon, minLat, maxLon, maxLat]")
     categories: Optional[List[str]] = Field(
@@ -41,13 +50,41 @@ class PoisData(BaseModel):
         False, description="Whether to use cached POI data if available")
 
 
-class IsochronePoisData(IsochroneData):
+class IsochronePoisData(IsochroneData, GeometryOptions):
+    categories: Optional[List[str]] = Field(
+        None, description="List of POI categories to filter")
+    overlap: Optional[bool] = Field(
+        True, description="Whether to return overlapping isochrones or non-overlapping ones")
+
+
+class IsochroneBatchData(BaseModel):
+    origins: List[IsochroneData] = Field(...,
+                                         description="List of isochrone origins")
     categories: Optional[List[str]] = Field(
         None, description="List of POI categories to filter")
     overlap: Optional[bool] = Field(
         True, description="Whether to return overlapping isochrones or non-overlapping ones")
 
 
+class AccessibilityData(IsochroneData):
+    categories: Optional[List[str]] = Field(
+        None, description="List of POI categories to count. Defaults to all")
+    cached: Optional[bool] = Field(
+        True, description="Whether to use cached POI data if available")
+    nearest: Optional[bool] = Field(
+        True, description="Whether to return the smallest cutoff reaching a POI of each category")
+
+
+class BandCounts(BaseModel):
+    cutoffSec: int
+    counts: Dict[str, int]
+
+
+class AccessibilityResponse(BaseModel):
+    bands: List[BandCounts]
+    nearest: Optional[Dict[str, Optional[int]]] = None
+
+
 class IsochroneResponse(BaseModel):
     isochrones: FeatureCollection
     pois: Optional[FeatureCollection] = None
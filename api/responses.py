@@ -0,0 +1,25 @@
+from typing import Any
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(exclude_none=True)
+    return str(value)
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize to JSON bytes, supporting numpy values and Pydantic models."""
+    return orjson.dumps(content, default=_default, option=OPTIONS)
+
+
+class GeoJSONResponse(JSONResponse):
+    """JSON response serialized with orjson, without validation against the response model.
+    Meant for the (possibly large) GeoJSON produced from GeoDataFrames, which is valid by construction."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,83 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from geopandas import GeoDataFrame
+
+
+def count_pois(isochrones: GeoDataFrame, pois: GeoDataFrame, cutoffs: list[int],
+               category_tags: dict[str, dict[str, list[str]]]) -> tuple[dict[int, dict[str, int]], dict[str, int | None]]:
+    """Count the POIs of each category reachable within each cutoff.
+
+    Args:
+        isochrones (GeoDataFrame): The overlapping isochrones, matched to the cutoffs by
+            their 'time' column, see get_band_cutoffs.
+        pois (GeoDataFrame): The POIs, with a 'category' column or else their OSM tag columns.
+        cutoffs (list[int]): The cutoffs (seconds) of the isochrones.
+        category_tags (dict[str, dict[str, list[str]]]): The OSM tags of each category.
+
+    Returns:
+        tuple[dict[int, dict[str, int]], dict[str, int | None]]: The POI counts by category for each cutoff,
+        and the smallest cutoff reaching a POI of each category (None if none is reachable).
+    """
+    categories = list(category_tags)
+    counts = {cutoff: dict.fromkeys(categories, 0) for cutoff in sorted(cutoffs)}
+    nearest = dict.fromkeys(categories)
+    if pois is None or pois.empty or isochrones is None or isochrones.empty:
+        return counts, nearest
+    band_cutoffs = get_band_cutoffs(isochrones, cutoffs)
+    matched = np.array([cutoff is not None for cutoff in band_cutoffs], dtype=bool)
+    if not matched.any():
+        return counts, nearest
+    bands = GeoDataFrame({"cutoff": [cutoff for cutoff in band_cutoffs if cutoff is not None]},
+                         geometry=isochrones.geometry.values[matched], crs=isochrones.crs)
+    pois = _categorize(pois, category_tags)
+    pois = pois.to_crs(bands.crs) if pois.crs else pois.set_crs(bands.crs)
+    joined = gpd.sjoin(pois[["category", pois.geometry.name]], bands,
+                       how="inner", predicate="intersects")
+    for (cutoff, category), count in joined.groupby(["cutoff", "category"]).size().items():
+        counts[cutoff][category] = int(count)
+    for category, cutoff in joined.groupby("category")["cutoff"].min().items():
+        nearest[category] = int(cutoff)
+    return counts, nearest
+
+
+def get_band_cutoffs(isochrones: GeoDataFrame, cutoffs: list[int]) -> list[int | None]:
+    """Get the cutoff of each isochrone, from its 'time' column (seconds).
+    Without time column, the isochrones are matched to the cutoffs by increasing area,
+    provided there is one per cutoff.
+
+    Args:
+        isochrones (GeoDataFrame): The overlapping isochrones.
+        cutoffs (list[int]): The requested cutoffs (seconds).
+
+    Returns:
+        list[int | None]: The cutoff of each isochrone, None if it matches none of the cutoffs.
+    """
+    if "time" in isochrones.columns:
+        requested = set(cutoffs)
+        return [int(time) if time == time and int(time) in requested else None
+                for time in isochrones["time"]]
+    cutoffs = sorted(set(cutoffs))
+    if len(isochrones) != len(cutoffs):
+        return [None] * len(isochrones)
+    band_cutoffs = [None] * len(isochrones)
+    # the overlapping isochrones are nested (only the order of the areas matters,
+    # they can be measured in degrees)
+    for position, cutoff in zip(np.argsort(shapely.area(isochrones.geometry.values), kind="stable"), cutoffs):
+        band_cutoffs[position] = cutoff
+    return band_cutoffs
+
+
+def _categorize(pois: GeoDataFrame, category_tags: dict[str, dict[str, list[str]]]) -> GeoDataFrame:
+    """Get one row per POI and category, from the 'category' column or else from the OSM tags."""
+    if "category" in pois.columns:
+        return pois[pois["category"].isin(list(category_tags))]
+    frames = []
+    for category, tags in category_tags.items():
+        mask = pd.Series(False, index=pois.index)
+        for key, values in tags.items():
+            if key in pois.columns:
+                mask |= pois[key].isin(values)
+        frames.append(pois[mask].assign(category=category))
+    return GeoDataFrame(pd.concat(frames), crs=pois.crs)
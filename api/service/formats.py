@@ -0,0 +1,115 @@
+import io
+import json
+import math
+import pandas as pd
+import pyarrow as pa
+from geopandas import GeoDataFrame
+
+# Supported output formats and their media types
+FORMATS = {
+    "geojson": "application/geo+json",
+    "arrow": "application/vnd.apache.arrow.file",
+    "parquet": "application/vnd.apache.parquet",
+    "fgb": "application/flatgeobuf",
+}
+
+# Columns holding the feature ids (the OSM element type and id), which GeoJSON keeps as the feature id
+INDEX_COLUMNS = ["element", "id"]
+
+# OpenAPI documentation of the binary responses
+BINARY_RESPONSES = {
+    200: {
+        "content": {media_type: {} for format, media_type in FORMATS.items() if format != "geojson"},
+        "description": "GeoJSON, or binary features when requested by the format parameter or the Accept header.",
+    }
+}
+
+
+def negotiate_format(format: str | None = None, accept: str | None = None) -> str | None:
+    """Get the output format, from the format parameter if provided or else from the Accept header.
+
+    Args:
+        format (str | None, optional): The requested format name, one of FORMATS.
+        accept (str | None, optional): The Accept header.
+
+    Returns:
+        str | None: The format name, None if the requested format is not supported.
+    """
+    if format:
+        return format if format in FORMATS else None
+    if accept:
+        for name, media_type in FORMATS.items():
+            if media_type in accept:
+                return name
+    return "geojson"
+
+
+def to_bytes(gdf: GeoDataFrame, format: str) -> bytes:
+    """Serialize the features in a binary format.
+
+    Args:
+        gdf (GeoDataFrame): The features.
+        format (str): The format name, one of 'arrow' (Arrow IPC file with WKB geometries),
+            'parquet' (GeoParquet) or 'fgb' (FlatGeobuf).
+
+    Returns:
+        bytes: The serialized features.
+    """
+    gdf = sanitize_columns(reset_ids(gdf))
+    buffer = io.BytesIO()
+    if format == "arrow":
+        table = pa.table(gdf.to_arrow(index=False))
+        with pa.ipc.new_file(buffer, table.schema) as writer:
+            writer.write_table(table)
+    elif format == "parquet":
+        gdf.to_parquet(buffer, index=False)
+    elif format == "fgb":
+        gdf.to_file(buffer, driver="FlatGeobuf", engine="pyogrio")
+    else:
+        raise ValueError(f"Unsupported format: {format}")
+    return buffer.getvalue()
+
+
+def concat_layers(layers: dict[str, GeoDataFrame | None]) -> GeoDataFrame:
+    """Combine several layers in a single table, identified by a 'layer' column,
+    as the binary formats only hold one table.
+
+    Args:
+        layers (dict[str, GeoDataFrame | None]): The features by layer name.
+
+    Returns:
+        GeoDataFrame: The features of all the layers.
+    """
+    frames = [reset_ids(gdf if gdf.crs else gdf.set_crs("EPSG:4326")).assign(layer=name)
+              for name, gdf in layers.items() if gdf is not None and not gdf.empty]
+    if not frames:
+        return GeoDataFrame({"layer": []}, geometry=[], crs="EPSG:4326")
+    return GeoDataFrame(pd.concat(frames, ignore_index=True), crs=frames[0].crs)
+
+
+def reset_ids(gdf: GeoDataFrame) -> GeoDataFrame:
+    """Move the feature ids from the index to columns, as the binary formats do not keep
+    the index: the OSM (element, id) index becomes the INDEX_COLUMNS. A default
+    (range) index is dropped."""
+    if isinstance(gdf.index, pd.RangeIndex):
+        return gdf
+    levels = gdf.index.nlevels
+    defaults = INDEX_COLUMNS[-levels:] if levels <= len(INDEX_COLUMNS) else [f"level_{i}" for i in range(levels)]
+    names = [name if name is not None else default for name, default in zip(gdf.index.names, defaults)]
+    return gdf.rename_axis(names).reset_index()
+
+
+def sanitize_columns(gdf: GeoDataFrame) -> GeoDataFrame:
+    """Make the columns serializable: OSM properties may mix strings with lists or dicts."""
+    gdf = gdf.copy()
+    for column in gdf.columns:
+        if column == gdf.geometry.name or gdf[column].dtype != object:
+            continue
+        gdf[column] = gdf[column].map(_to_str)
+    return gdf
+
+
+def _to_str(value):
+    if value is None or isinstance(value, str) or (isinstance(value, float) and math.isnan(value)):
+        return value
+    return json.dumps(value, default=str)
@@ -0,0 +1,108 @@
+import time
+from collections import OrderedDict
+from typing import Dict
+import shapely
+from geopandas import GeoDataFrame
+
+
+def get_frame_size(frame: GeoDataFrame) -> int:
+    """Estimate the memory size of a frame (bytes): its columns and its coordinates."""
+    size = int(frame.drop(columns=frame.geometry.name).memory_usage(deep=True).sum())
+    return size + int(shapely.get_num_coordinates(frame.geometry.values).sum()) * 16 + len(frame) * 64
+
+
+class FrameCache:
+    """Least recently used cache of decoded frames, bounded by their memory size."""
+
+    def __init__(self, max_bytes: int):
+        """
+        Args:
+            max_bytes (int): The maximum memory size of the cached frames (bytes).
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # incremented by each invalidation, so that the frames read before are not cached
+        self.generation = 0
+        # frame, its size and when it was written in the shared cache (timestamp), by key
+        self._entries: OrderedDict[str, tuple[GeoDataFrame, int, float]] = OrderedDict()
+
+    def get(self, key: str, max_age: float | None = None) -> GeoDataFrame | None:
+        """Get a cached frame.
+
+        Args:
+            key (str): The cache key.
+            max_age (float | None, optional): The maximum age of the frame since it was written
+                in the shared cache (seconds). Defaults to none.
+
+        Returns:
+            GeoDataFrame | None: The frame, None if it is not cached or too old.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and max_age is not None and time.time() - entry[2] > max_age:
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: str, frame: GeoDataFrame, written_at: float, generation: int) -> None:
+        """Cache a frame, evicting the least recently used ones to stay within the memory size.
+
+        Args:
+            key (str): The cache key.
+            frame (GeoDataFrame): The frame.
+            written_at (float): When the frame was written in the shared cache (timestamp).
+            generation (int): The generation of this cache when the frame was read from the
+                shared cache: the frame is not cached if it was invalidated since.
+        """
+        if generation != self.generation:
+            return
+        self._remove(key)
+        size = get_frame_size(frame)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (frame, size, written_at)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        self.generation += 1
+        self._remove(key)
+
+    def invalidate_prefix(self, prefix: str) -> None:
+        self.generation += 1
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            self._remove(key)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+        self.size = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def stats(self) -> Dict:
+        """Get the size and the hit, miss and eviction counts."""
+        return {
+            "entries": len(self._entries),
+            "size": self.size,
+            "max_size": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
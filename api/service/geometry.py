@@ -0,0 +1,53 @@
+import numpy as np
+import shapely
+from geopandas import GeoDataFrame, GeoSeries
+
+# Size of a map tile (pixels)
+TILE_SIZE = 256
+
+
+def get_tolerance(simplify: float | None = None, zoom: int | None = None) -> float | None:
+    """Get the simplification tolerance (degrees), either explicit or the size of
+    one pixel at the target zoom level.
+
+    Args:
+        simplify (float | None, optional): The simplification tolerance (degrees).
+        zoom (int | None, optional): The target zoom level.
+
+    Returns:
+        float | None: The tolerance, None if no simplification is requested.
+    """
+    if simplify is not None:
+        return simplify
+    if zoom is not None:
+        return 360.0 / (TILE_SIZE * 2 ** zoom)
+    return None
+
+
+def simplify_geometries(gdf: GeoDataFrame, tolerance: float | None = None, precision: int | None = None,
+                        coverage: bool = False) -> GeoDataFrame:
+    """Simplify the geometries, preserving topology, and round their coordinates.
+
+    Args:
+        gdf (GeoDataFrame): The features.
+        tolerance (float | None, optional): The simplification tolerance (degrees).
+        precision (int | None, optional): The number of decimals of the coordinates.
+        coverage (bool, optional): Whether the geometries are non-overlapping polygons, whose shared
+            boundaries are then simplified once so that no gap or overlap opens between them.
+
+    Returns:
+        GeoDataFrame: A copy of the features with simplified geometries.
+    """
+    if gdf is None or gdf.empty or (tolerance is None and precision is None):
+        return gdf
+    geometries = gdf.geometry
+    if tolerance and coverage:
+        geometries = GeoSeries(shapely.coverage_simplify(np.asarray(geometries.values), tolerance),
+                               index=geometries.index, crs=geometries.crs)
+    elif tolerance:
+        geometries = geometries.simplify(tolerance, preserve_topology=True)
+    if precision is not None:
+        geometries = geometries.set_precision(10 ** -precision)
+    simplified = gdf.copy()
+    simplified[gdf.geometry.name] = geometries
+    return simplified
@@ -0,0 +1,479 @@
+import asyncio
+import logging
+import math
+from datetime import datetime
+from typing import AsyncIterator, Dict
+from geopandas import GeoDataFrame
+from isochrones import intersect_isochrones
+from ..cache import redis
+from ..executor import run_cpu
+from ..models.isochrones import AccessibilityData, IsochroneData, IsochroneBatchData, IsochronePoisData
+from ..responses import dumps
+from ..singleflight import SingleFlight, redis_single_flight
+from .pois import CATEGORY_TAGS, PoisService
+from .accessibility import count_pois, get_band_cutoffs
+from .otp import otp
+from .geometry import get_tolerance, simplify_geometries
+from ..config import config
+import hashlib
+import json
+import orjson
+
+# Approximate length of one degree of latitude (meters)
+METERS_PER_DEGREE = 111_320.0
+
+# Identical requests being computed in this worker
+in_flight = SingleFlight()
+
+
+class IsochronesService:
+
+    async def compute(self, data: IsochronePoisData) -> Dict:
+        """Compute the isochrones and the points of interest they contain.
+        Concurrent identical requests share the same computation, within this worker
+        and, if enabled, across workers.
+
+        Args:
+            data (IsochronePoisData): The isochrone and POI request parameters.
+
+        Returns:
+            Dict: The isochrones and the intersected POIs (if any), as GeoJSON
+            FeatureCollections following the IsochroneResponse schema.
+        """
+        key = self._make_request_key(data)
+        if config.ISOCHRONES_SINGLE_FLIGHT_REDIS:
+            return await in_flight.do(key, lambda: self._compute_distributed(key, data))
+        return await in_flight.do(key, lambda: self._compute(data))
+
+    async def _compute_distributed(self, key: str, data: IsochronePoisData) -> Dict:
+        result_key = f"{key}:result"
+
+        async def get_result() -> Dict | None:
+            result = await redis.get(result_key)
+            return orjson.loads(result) if result else None
+
+        async def compute() -> Dict:
+            response = await self._compute(data)
+            await redis.set(result_key, dumps(response),
+                            ex=config.ISOCHRONES_SINGLE_FLIGHT_EXPIRY)
+            return response
+
+        return await redis_single_flight(
+            f"{key}:lock", get_result, compute,
+            lease=config.OTP_TIMEOUT + 30,
+            timeout=config.OTP_TIMEOUT + 30)
+
+    async def compute_frames(self, data: IsochronePoisData) -> tuple[GeoDataFrame, GeoDataFrame | None]:
+        """Compute the isochrones and the points of interest they contain, as GeoDataFrames.
+        Concurrent identical requests share the same computation within this worker.
+
+        Args:
+            data (IsochronePoisData): The isochrone and POI request parameters.
+
+        Returns:
+            tuple[GeoDataFrame, GeoDataFrame | None]: The isochrones and the intersected POIs.
+        """
+        key = f"{self._make_request_key(data)}:frames"
+        return await in_flight.do(key, lambda: self._compute_frames(data))
+
+    async def compute_accessibility(self, data: AccessibilityData) -> Dict:
+        """Count the POIs of each category reachable within each cutoff, from the
+        overlapping isochrones. Concurrent identical requests share the same computation
+        within this worker.
+
+        Args:
+            data (AccessibilityData): The isochrone parameters and the POI categories.
+
+        Returns:
+            Dict: The POI counts by cutoff and category, and the smallest cutoff reaching
+            a POI of each category if requested, following the AccessibilityResponse schema.
+        """
+        key = f"{self._make_request_key(data)}:accessibility"
+        return await in_flight.do(key, lambda: self._compute_accessibility(data))
+
+    async def _compute_accessibility(self, data: AccessibilityData) -> Dict:
+        isochrones = await self.get_isochrones(data)
+        categories = data.categories if data.categories else list(CATEGORY_TAGS.keys())
+        pois_service = PoisService()
+        pois = None
+        if isochrones is not None and not isochrones.empty:
+            pois = await pois_service.get_features(
+                list(isochrones.total_bounds), categories, cached=data.cached)
+        counts, nearest = await run_cpu(
+            count_pois, isochrones, pois, data.cutoffSec,
+            {category: pois_service._make_tags([category]) for category in categories})
+        response = {"bands": [{"cutoffSec": cutoff, "counts": category_counts}
+                              for cutoff, category_counts in counts.items()]}
+        if data.nearest:
+            response["nearest"] = nearest
+        return response
+
+    async def _compute(self, data: IsochronePoisData) -> Dict:
+        isochrones, pois = await self._compute_frames(data)
+        response = {"isochrones": isochrones.__geo_interface__}
+        if pois is not None:
+            response["pois"] = pois.__geo_interface__
+        return response
+
+    async def _compute_frames(self, data: IsochronePoisData) -> tuple[GeoDataFrame, GeoDataFrame | None]:
+        isochrones = await self.get_isochrones(data)
+        output_isochrones = await self.get_simplified_isochrones(data, isochrones)
+        if data.categories is None or len(data.categories) == 0:
+            return output_isochrones, None
+
+        # Calculate bounding box from isochrones
+        bbox = list(isochrones.total_bounds)
+
+        try:
+            # Fetch OSM features within the bounding box
+            pois_service = PoisService()
+            pois = await pois_service.get_pois(bbox=bbox, categories=data.categories)
+            if pois is None or pois.get("features") is None or len(pois.get("features")) == 0:
+                return output_isochrones, None
+
+            # Intersect isochrones with POIs
+            pois_gdf = GeoDataFrame.from_features(pois)
+            intersected_pois = await run_cpu(intersect_isochrones, isochrones, pois_gdf)
+            if intersected_pois is None or intersected_pois.empty:
+                return output_isochrones, None
+            intersected_pois = await self._simplify(data, intersected_pois)
+        except Exception as e:
+            logging.error(e, exc_info=True)
+            return output_isochrones, None
+
+        return output_isochrones, intersected_pois
+
+    async def get_simplified_isochrones(self, data: IsochronePoisData, isochrones: GeoDataFrame) -> GeoDataFrame:
+        """Simplify the isochrones as requested, using the cache when possible.
+
+        Args:
+            data (IsochronePoisData): The request parameters, with the simplification options.
+            isochrones (GeoDataFrame): The isochrones computed for this request.
+
+        Returns:
+            GeoDataFrame: The simplified isochrones.
+        """
+        tolerance = get_tolerance(data.simplify, data.zoom)
+        if tolerance is None and data.precision is None:
+            return isochrones
+        cache_key = f"{self._make_cache_key(data)}:simplified:{tolerance}:{data.precision}"
+        try:
+            cached_data_json_str = await redis.get(cache_key)
+            if cached_data_json_str:
+                logging.info(f"Cache hit for key: {cache_key}")
+                return GeoDataFrame.from_features(json.loads(cached_data_json_str), crs="EPSG:4326")
+        except Exception as e:
+            logging.error(e, exc_info=True)
+        # the non-overlapping bands share their boundaries
+        simplified = await run_cpu(simplify_geometries, isochrones, tolerance, data.precision,
+                                   not getattr(data, 'overlap', True))
+        try:
+            await redis.set(cache_key, simplified.to_json(),
+                            ex=config.CACHE_ISOCHRONES_EXPIRY)
+        except Exception as e:
+            logging.error(e, exc_info=True)
+        return simplified
+
+    async def _simplify(self, data: IsochronePoisData, features: GeoDataFrame) -> GeoDataFrame:
+        tolerance = get_tolerance(data.simplify, data.zoom)
+        if tolerance is None and data.precision is None:
+            return features
+        return await run_cpu(simplify_geometries, features, tolerance, data.precision)
+
+    async def get_isochrones(self, data: IsochroneData) -> GeoDataFrame:
+        """Compute the isochrones for the provided data, using the cache when possible.
+
+        Args:
+            data (IsochroneData): The isochrone request parameters.
+
+        Returns:
+            GeoDataFrame: The isochrones, one row per cutoff.
+        """
+        cache_key = self._make_cache_key(data)
+        try:
+            cached_data_json_str = await redis.get(cache_key)
+            if cached_data_json_str:
+                logging.info(f"Cache hit for key: {cache_key}")
+                await redis.incr("isochrones:stats:hits")
+                cached_data = json.loads(cached_data_json_str)
+                return GeoDataFrame.from_features(cached_data, crs="EPSG:4326")
+            await redis.incr("isochrones:stats:misses")
+        except Exception as e:
+            # Redis being unavailable must not prevent the computation
+            logging.error(e, exc_info=True)
+        logging.info(f"Cache miss for key: {cache_key}. Computing isochrones...")
+        # computed from the cell origin and slot start, so that the cached isochrones
+        # do not depend on which request of the cell came first
+        lon, lat, date_time = self._get_cache_origin(data)
+        isochrones = await otp.calculate_isochrones(
+            lat=lat,
+            lon=lon,
+            cutoffSec=data.cutoffSec,
+            date_time=date_time,
+            mode=data.mode,
+            bike_speed=data.bikeSpeed,
+            router='default',
+            overlap=getattr(data, 'overlap', True),
+        )
+        if isochrones is not None and not isochrones.empty:
+            try:
+                await redis.set(cache_key, isochrones.to_json(),
+                                ex=config.CACHE_ISOCHRONES_EXPIRY)
+            except Exception as e:
+                logging.error(e, exc_info=True)
+        return isochrones
+
+    async def compute_batch(self, data: IsochroneBatchData) -> AsyncIterator[bytes]:
+        """Compute the isochrones of many origins, with a bounded number of concurrent OTP calls.
+        The isochrones of each origin are emitted as soon as they are computed. The POIs are
+        then fetched once for the union of the isochrones bounding boxes and intersected with
+        the isochrones of each origin.
+
+        Args:
+            data (IsochroneBatchData): The origins and the POI categories.
+
+        Yields:
+            bytes: JSON lines, in completion order, with the origin index and either its isochrones
+            or an error. If categories were requested, followed by a line per computed origin
+            with its POIs (null if none, with an error if they could not be fetched).
+        """
+        semaphore = asyncio.Semaphore(config.ISOCHRONES_BATCH_CONCURRENCY)
+
+        async def compute(index: int, origin: IsochroneData) -> tuple[int, GeoDataFrame | None, str | None]:
+            async with semaphore:
+                try:
+                    isochrones = await self.get_isochrones(
+                        IsochronePoisData(**origin.model_dump(), overlap=data.overlap))
+                    return index, isochrones, None
+                except Exception as e:
+                    logging.error(e, exc_info=True)
+                    return index, None, str(e)
+
+        async def intersect(index: int, isochrones: GeoDataFrame, pois: GeoDataFrame) -> tuple[int, GeoDataFrame | None]:
+            try:
+                bbox = isochrones.total_bounds
+                inner_pois = pois.cx[bbox[0]:bbox[2], bbox[1]:bbox[3]]
+                if inner_pois.empty:
+                    return index, None
+                return index, await run_cpu(intersect_isochrones, isochrones, inner_pois)
+            except Exception as e:
+                logging.error(e, exc_info=True)
+                return index, None
+
+        tasks = [asyncio.create_task(compute(index, origin))
+                 for index, origin in enumerate(data.origins)]
+        try:
+            computed = {}
+            for task in asyncio.as_completed(tasks):
+                index, isochrones, error = await task
+                if error is not None or isochrones is None or isochrones.empty:
+                    yield self._make_batch_line(index, error=error or "No isochrones computed")
+                    continue
+                yield self._make_batch_line(index, isochrones=isochrones)
+                if data.categories:
+                    computed[index] = isochrones
+            if not computed:
+                return
+
+            # Fetch the POIs once for all the origins
+            bounds = [isochrones.total_bounds for isochrones in computed.values()]
+            bbox = [min(b[0] for b in bounds), min(b[1] for b in bounds),
+                    max(b[2] for b in bounds), max(b[3] for b in bounds)]
+            try:
+                pois = await PoisService().get_pois(bbox=bbox, categories=data.categories)
+                pois_gdf = GeoDataFrame.from_features(pois, crs="EPSG:4326") if pois.get("features") else None
+            except Exception as e:
+                logging.error(e, exc_info=True)
+                for index in computed:
+                    yield self._make_pois_line(index, error=f"POIs unavailable: {e}")
+                return
+            if pois_gdf is None:
+                for index in computed:
+                    yield self._make_pois_line(index)
+                return
+
+            tasks = [asyncio.create_task(intersect(index, isochrones, pois_gdf))
+                     for index, isochrones in computed.items()]
+            for task in asyncio.as_completed(tasks):
+                index, intersected_pois = await task
+                yield self._make_pois_line(index, pois=intersected_pois)
+        finally:
+            # The client may have gone away
+            for task in tasks:
+                task.cancel()
+
+    async def compute_stream(self, data: IsochronePoisData) -> AsyncIterator[Dict]:
+        """Compute the isochrones and their points of interest band by band.
+        All the cutoffs are computed by a single OTP call, and the POIs are fetched once
+        for the largest band. Bands are emitted in increasing cutoff order, each followed
+        by its POIs as soon as they are intersected.
+
+        Args:
+            data (IsochronePoisData): The isochrone and POI request parameters.
+
+        Yields:
+            Dict: An 'isochrone' message with the band, then a 'pois' message with its
+            intersected POIs (if categories were requested), or an 'error' message.
+        """
+        cutoffs = sorted(set(data.cutoffSec))
+        request = data.model_dump(exclude={"cutoffSec", "overlap"})
+        try:
+            # overlapping, to share the cache with the other requests
+            isochrones = await self.get_isochrones(
+                IsochronePoisData(**request, cutoffSec=cutoffs, overlap=True))
+        except Exception as e:
+            logging.error(e, exc_info=True)
+            for cutoff in cutoffs:
+                yield {"type": "error", "cutoffSec": cutoff, "error": str(e)}
+            return
+        if isochrones is None or isochrones.empty:
+            for cutoff in cutoffs:
+                yield {"type": "error", "cutoffSec": cutoff, "error": "No isochrones computed"}
+            return
+        band_cutoffs = get_band_cutoffs(isochrones, cutoffs)
+        pois_task = None
+        if data.categories:
+            pois_task = asyncio.create_task(PoisService().get_features(
+                list(isochrones.total_bounds), data.categories))
+        previous = None
+        try:
+            for cutoff in cutoffs:
+                isochrone = isochrones[[band_cutoff == cutoff for band_cutoff in band_cutoffs]]
+                if isochrone.empty:
+                    yield {"type": "error", "cutoffSec": cutoff, "error": "No isochrones computed"}
+                    continue
+                # simplified before the differences, so that no gap opens between the bands
+                output_isochrone = await self._simplify(data, isochrone)
+                band = isochrone
+                output_band = output_isochrone
+                if not data.overlap and previous is not None:
+                    # Remove the area already reachable within the previous cutoff
+                    band = isochrone.copy()
+                    band["geometry"] = isochrone.geometry.difference(previous[0])
+                    output_band = output_isochrone.copy()
+                    output_band["geometry"] = output_isochrone.geometry.difference(previous[1])
+                previous = (isochrone.geometry.union_all(), output_isochrone.geometry.union_all())
+                yield {"type": "isochrone", "cutoffSec": cutoff, "isochrones": output_band.__geo_interface__}
+
+                if pois_task is None:
+                    continue
+                try:
+                    pois = await pois_task
+                    intersected_pois = None
+                    if pois is not None and not pois.empty:
+                        bbox = band.total_bounds
+                        band_pois = pois.cx[bbox[0]:bbox[2], bbox[1]:bbox[3]]
+                        if not band_pois.empty:
+                            intersected_pois = await run_cpu(intersect_isochrones, band, band_pois)
+                            intersected_pois = await self._simplify(data, intersected_pois)
+                    yield {"type": "pois", "cutoffSec": cutoff,
+                           "pois": intersected_pois.__geo_interface__
+                           if intersected_pois is not None and not intersected_pois.empty
+                           else None}
+                except Exception as e:
+                    logging.error(e, exc_info=True)
+                    yield {"type": "error", "cutoffSec": cutoff, "error": str(e)}
+        finally:
+            # The client may have gone away
+            if pois_task is not None:
+                pois_task.cancel()
+
+    async def get_cache_stats(self) -> Dict:
+        """Get the isochrones cache hit/miss counters."""
+        hits, misses = await redis.mget("isochrones:stats:hits", "isochrones:stats:misses")
+        hits = int(hits) if hits else 0
+        misses = int(misses) if misses else 0
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else 0.0,
+        }
+
+    def _make_batch_line(self, index: int, isochrones: GeoDataFrame | None = None,
+                         error: str | None = None) -> bytes:
+        line = {"index": index}
+        if error is not None:
+            line["error"] = error
+        if isochrones is not None:
+            line["isochrones"] = isochrones.__geo_interface__
+        return dumps(line) + b"\n"
+
+    def _make_pois_line(self, index: int, pois: GeoDataFrame | None = None,
+                        error: str | None = None) -> bytes:
+        line = {"index": index, "pois": pois.__geo_interface__ if pois is not None and not pois.empty else None}
+        if error is not None:
+            line["error"] = error
+        return dumps(line) + b"\n"
+
+    def _make_request_key(self, data: IsochronePoisData) -> str:
+        """Create a key identifying identical requests.
+
+        Args:
+            data (IsochronePoisData): The isochrone and POI request parameters.
+
+        Returns:
+            str: The generated key.
+        """
+        request = data.model_dump()
+        request["cutoffSec"] = sorted(request["cutoffSec"])
+        request["categories"] = sorted(request["categories"] or [])
+        request_str = json.dumps(request, sort_keys=True)
+        return f"isochrones:inflight:{hashlib.md5(request_str.encode()).hexdigest()}"
+
+    def _make_cache_key(self, data: IsochroneData) -> str:
+        """Create a cache key for the isochrone request.
+        The origin is snapped to a grid and the departure time is bucketed by
+        time slot, so that nearby requests share the same entry.
+
+        Args:
+            data (IsochroneData): The isochrone request parameters.
+
+        Returns:
+            str: The generated cache key.
+        """
+        lon, lat, date_time = self._get_cache_origin(data)
+        cutoffs = ",".join(map(str, sorted(data.cutoffSec)))
+        cache_string = ":".join([
+            f"{lon:.6f}",
+            f"{lat:.6f}",
+            str(data.mode),
+            str(data.bikeSpeed),
+            cutoffs,
+            str(getattr(data, 'overlap', True)),
+            date_time.isoformat(),
+        ])
+        return f"isochrones:{hashlib.md5(cache_string.encode()).hexdigest()}"
+
+    def _get_cache_origin(self, data: IsochroneData) -> tuple[float, float, datetime]:
+        """Get the origin and departure time the isochrones of a cache entry are computed from:
+        the origin snapped to the grid and the start of the departure time slot.
+
+        Args:
+            data (IsochroneData): The isochrone request parameters.
+
+        Returns:
+            tuple[float, float, datetime]: The snapped longitude and latitude, and the slot start.
+        """
+        lon, lat = self._snap(data.lon, data.lat)
+        date_time = datetime.fromisoformat(data.datetime)
+        minutes = (date_time.hour * 60 + date_time.minute) // config.CACHE_ISOCHRONES_SLOT * config.CACHE_ISOCHRONES_SLOT
+        slot = date_time.replace(hour=minutes // 60, minute=minutes % 60, second=0, microsecond=0)
+        return lon, lat, slot
+
+    def _snap(self, lon: float, lat: float) -> tuple[float, float]:
+        """Snap a point to the cache grid.
+
+        Args:
+            lon (float): Longitude.
+            lat (float): Latitude.
+
+        Returns:
+            tuple[float, float]: The snapped longitude and latitude.
+        """
+        lat_step = config.CACHE_ISOCHRONES_GRID / METERS_PER_DEGREE
+        snapped_lat = round(lat / lat_step) * lat_step
+        lon_step = config.CACHE_ISOCHRONES_GRID / \
+            (METERS_PER_DEGREE * max(math.cos(math.radians(snapped_lat)), 1e-6))
+        snapped_lon = round(lon / lon_step) * lon_step
+        return snapped_lon, snapped_lat
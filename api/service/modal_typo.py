@@ -0,0 +1,197 @@
+"""Typology datasets and computations.
+
+The datasets are loaded lazily, from a snapshot of uncompressed Arrow IPC files when
+available: they are memory-mapped, so that loading is fast and the pages are shared by
+all the workers. Write the snapshot with:
+    python -m api.service.modal_typo
+"""
+import copy
+import functools
+import logging
+import os
+import threading
+from typing import Any
+import pyarrow as pa
+from geopandas import GeoDataFrame
+from typo_modal.service import TypoModalService, load_data
+from ..config import config
+
+# Names of the datasets returned by load_data, in order
+DATASETS = ["od_mm", "orig_dess", "dest_dess", "can_df"]
+
+# Methods depending only on their arguments and the datasets, whose results are memoized
+MEMOIZED_METHODS = {"compute_geo", "compute_typo"}
+
+# The datasets loaded in this process, whether they are ready, and why the last load failed
+datasets: tuple | None = None
+ready = False
+load_error: str | None = None
+_lock = threading.Lock()
+# The service shared by all the computations of this process
+service: TypoModalService | None = None
+
+
+def load() -> tuple:
+    """Load the typology datasets, once per process, from the snapshot if available.
+
+    Returns:
+        tuple: The od_mm, orig_dess, dest_dess and can_df datasets.
+    """
+    global datasets, ready, load_error
+    with _lock:
+        if datasets is None:
+            try:
+                if has_snapshot():
+                    datasets = read_snapshot()
+                    logging.info(f"Loaded typology datasets from {config.TYPO_SNAPSHOT_DIR}.")
+                else:
+                    datasets = load_data()
+                    logging.info("Loaded typology datasets.")
+            except Exception as e:
+                load_error = str(e)
+                raise
+            load_error = None
+            ready = True
+        return datasets
+
+
+def _after_fork_in_child() -> None:
+    """Reset the lock in a forked process: the fork may happen (e.g. the CPU executor
+    starting its processes) while another thread holds the lock to load the datasets, which
+    the child then loads itself on first use."""
+    global _lock
+    _lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def is_ready() -> bool:
+    """Whether the datasets are loaded in this process."""
+    return ready
+
+
+def get_load_error() -> str | None:
+    """Why the datasets could not be loaded in this process, None unless the last load failed."""
+    return load_error
+
+
+def get_service() -> TypoModalService:
+    """Get the service of this process, created once the datasets are loaded, so that
+    its setup is not repeated by every computation. Created before forking the workers
+    when the application is preloaded, else on first use."""
+    global service
+    if service is None:
+        loaded = load()
+        with _lock:
+            if service is None:
+                service = TypoModalService(*loaded)
+    return service
+
+
+def compute(method: str, *args) -> Any:
+    """Call a TypoModalService compute method on the typology datasets.
+    Module level so that it can be dispatched to the CPU executor.
+
+    Args:
+        method (str): The name of the TypoModalService method, e.g. 'compute_typo'.
+        *args: The method arguments.
+
+    Returns:
+        Any: The method result.
+    """
+    if method in MEMOIZED_METHODS:
+        # a copy, as the callers may modify the result
+        return copy.deepcopy(_compute_memoized(method, *args))
+    return getattr(get_service(), method)(*args)
+
+
+@functools.lru_cache(maxsize=config.TYPO_CACHE_SIZE)
+def _compute_memoized(method: str, *args) -> Any:
+    return getattr(get_service(), method)(*args)
+
+
+# Arguments of compute_typo, and of compute_reco_multi after the trip arguments
+TYPO_FIELDS = ["a_voit", "a_moto", "a_tpu", "a_train", "a_marc", "a_velo",
+               "i_tmps", "i_prix", "i_flex", "i_conf", "i_fiab", "i_prof", "i_envi"]
+RECO_MULTI_FIELDS = ["a_voit", "a_moto", "a_tpu", "a_train", "a_velo", "a_marc",
+                     "i_tmps", "i_prix", "i_flex", "i_conf", "i_fiab", "i_prof", "i_envi"]
+
+
+def compute_rows(rows: list[dict], kinds: list[str]) -> list[dict]:
+    """Score survey rows, as the /typo, /reco-multi and /reco-pro-h3 endpoints would.
+    Module level so that it can be dispatched to the CPU executor.
+
+    Args:
+        rows (list[dict]): The rows, following the schemas of the kinds.
+        kinds (list[str]): The scores to compute: 'typo' (TypoData), 'reco_multi' (RecoMultiData2,
+            the multimodal recommendation) and 'reco_pro' (RecoProData2, the pro recommendations).
+
+    Returns:
+        list[dict]: The result of each row: its typo, reco_dt2, scores, access and reco_pros, or an error.
+    """
+    results = []
+    for row in rows:
+        try:
+            result = {}
+            if "typo" in kinds:
+                result["typo"] = compute("compute_typo", *[row[field] for field in TYPO_FIELDS])
+            if "reco_multi" in kinds:
+                t_traj_mm = compute("compute_geo", row["o_lon"], row["o_lat"], row["d_lon"], row["d_lat"])
+                reco_dt2, scores, access = compute(
+                    "compute_reco_multi", t_traj_mm, row["tps_traj"], row["constraints"],
+                    row["freq_mod_journeys"], *[row[field] for field in RECO_MULTI_FIELDS])
+                result.update(reco_dt2=reco_dt2, scores=scores, access=access)
+            if "reco_pro" in kinds:
+                result["reco_pros"] = compute(
+                    "compute_reco_pro_h3",
+                    {"velo": row["score_velo"], "tpu": row["score_tpu"],
+                     "train": row["score_train"], "elec": row["score_elec"]},
+                    row["freq_mod_pro_journeys"], row["d_lat"], row["d_lon"])
+        except Exception as e:
+            logging.error(e, exc_info=True)
+            result = {"error": str(e)}
+        results.append(result)
+    return results
+
+
+def has_snapshot() -> bool:
+    return all(os.path.exists(_get_snapshot_path(name)) for name in DATASETS)
+
+
+def write_snapshot() -> None:
+    """Write the datasets returned by load_data as uncompressed Arrow IPC files."""
+    os.makedirs(config.TYPO_SNAPSHOT_DIR, exist_ok=True)
+    for name, df in zip(DATASETS, load_data()):
+        if isinstance(df, GeoDataFrame):
+            table = pa.table(df.to_arrow(index=True, geometry_encoding="WKB"))
+        else:
+            table = pa.Table.from_pandas(df, preserve_index=True)
+        path = _get_snapshot_path(name)
+        with pa.OSFile(f"{path}.tmp", "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(f"{path}.tmp", path)
+        logging.info(f"Wrote {name} ({len(df)} rows) to {path}.")
+
+
+def read_snapshot() -> tuple:
+    """Read the datasets from the memory-mapped snapshot. The numeric columns
+    are not copied, and are read-only."""
+    frames = []
+    for name in DATASETS:
+        table = pa.ipc.open_file(pa.memory_map(_get_snapshot_path(name))).read_all()
+        if any(field.metadata and b"ARROW:extension:name" in field.metadata for field in table.schema):
+            frames.append(GeoDataFrame.from_arrow(table))
+        else:
+            frames.append(table.to_pandas(split_blocks=True))
+    return tuple(frames)
+
+
+def _get_snapshot_path(name: str) -> str:
+    return os.path.join(config.TYPO_SNAPSHOT_DIR, f"{name}.arrow")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    write_snapshot()
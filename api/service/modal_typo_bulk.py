@@ -0,0 +1,215 @@
+import asyncio
+import io
+import json
+from typing import AsyncIterator
+import orjson
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pydantic import BaseModel, ValidationError
+from ..config import config
+from ..executor import run_cpu, run_io
+from ..models.modal_typo import RecoMultiData2, RecoProData2, TypoData
+from .modal_typo import compute_rows
+
+# Supported survey file formats and their media types
+BULK_FORMATS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "ndjson": "application/x-ndjson",
+}
+
+# Scores computed when all the required columns of their schema are provided, see compute_rows
+BULK_MODELS: dict[str, type[BaseModel]] = {
+    "typo": TypoData,
+    "reco_multi": RecoMultiData2,
+    "reco_pro": RecoProData2,
+}
+
+# Columns holding nested values, JSON encoded in CSV files
+NESTED_COLUMNS = ["constraints", "freq_mod_journeys", "freq_mod_pro_journeys"]
+
+# Columns of the results
+RESULT_COLUMNS = ["typo", "reco_dt2", "scores", "access", "reco_pros", "error"]
+
+
+def negotiate_bulk_format(format: str | None = None, content_type: str | None = None) -> str | None:
+    """Get the survey file format, from the format parameter if provided or else from the Content-Type header.
+
+    Args:
+        format (str | None, optional): The format name, one of BULK_FORMATS.
+        content_type (str | None, optional): The Content-Type header.
+
+    Returns:
+        str | None: The format name, None if not supported.
+    """
+    if format:
+        return format if format in BULK_FORMATS else None
+    if content_type:
+        for name, media_type in BULK_FORMATS.items():
+            if media_type in content_type:
+                return name
+    return None
+
+
+def read_survey(content: bytes, format: str) -> pd.DataFrame:
+    """Read a survey file, one respondent per row.
+
+    Args:
+        content (bytes): The file content.
+        format (str): The format name, one of BULK_FORMATS.
+
+    Returns:
+        pd.DataFrame: The rows.
+    """
+    if format == "csv":
+        return pd.read_csv(io.BytesIO(content))
+    if format == "parquet":
+        return pd.read_parquet(io.BytesIO(content))
+    return pd.read_json(io.BytesIO(content), lines=True, dtype=False)
+
+
+class SurveyScorer:
+    """Score the rows of a survey file, streaming the results in the same format."""
+
+    def __init__(self, survey: pd.DataFrame, format: str):
+        """
+        Args:
+            survey (pd.DataFrame): The rows, following the TypoData schema, and RecoMultiData2
+                to also compute the multimodal recommendations, or RecoProData2 for the pro ones.
+            format (str): The output format name, one of BULK_FORMATS.
+        """
+        self.survey = survey.reset_index(drop=True)
+        self.format = format
+        # the scores whose columns are provided, else the typology, reporting the missing columns
+        self.kinds = [kind for kind, model in BULK_MODELS.items()
+                      if all(name in survey.columns for name, field in model.model_fields.items() if field.is_required())]
+        self.kinds = self.kinds or ["typo"]
+
+    async def score(self) -> AsyncIterator[bytes]:
+        """Score the rows, in chunks run in the process pool. Identical rows are only scored once.
+
+        Yields:
+            bytes: The results of each chunk of rows, in the input order: the input columns
+            followed by the result columns (JSON encoded in CSV and Parquet).
+        """
+        rows, errors = await run_cpu(self._validate)
+        # unique rows, in order of first occurrence
+        unique_rows: dict[bytes, int] = {}
+        row_keys = []
+        for row in rows:
+            key = orjson.dumps(row, option=orjson.OPT_SORT_KEYS) if row is not None else None
+            if key is not None and key not in unique_rows:
+                unique_rows[key] = len(unique_rows)
+            row_keys.append(key)
+        unique_list = [orjson.loads(key) for key in unique_rows]
+        chunk_size = config.TYPO_BULK_CHUNK
+        tasks = [asyncio.ensure_future(run_cpu(compute_rows, unique_list[i:i + chunk_size], self.kinds))
+                 for i in range(0, len(unique_list), chunk_size)]
+        writer = _SurveyWriter(self.format)
+        try:
+            for start in range(0, len(rows), chunk_size):
+                chunk_results = []
+                for key, error in zip(row_keys[start:start + chunk_size], errors[start:start + chunk_size]):
+                    if key is None:
+                        chunk_results.append({"error": error})
+                        continue
+                    position = unique_rows[key]
+                    chunk_results.append((await tasks[position // chunk_size])[position % chunk_size])
+                yield await run_io(writer.write, self.survey.iloc[start:start + chunk_size], chunk_results)
+            yield writer.close()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _validate(self) -> tuple[list[dict | None], list[str | None]]:
+        """Validate the rows against the models of the scores, None and the error if invalid.
+        Run in the CPU executor."""
+        records = orjson.loads(self.survey.to_json(orient="records"))
+        rows, errors = [], []
+        for record in records:
+            record = {name: value for name, value in record.items() if value is not None}
+            try:
+                for name in NESTED_COLUMNS:
+                    # nested values are JSON encoded in CSV files
+                    if isinstance(record.get(name), str):
+                        record[name] = json.loads(record[name])
+                row = {}
+                for kind in self.kinds:
+                    row.update(BULK_MODELS[kind].model_validate(record).model_dump())
+                rows.append(row)
+                errors.append(None)
+            except (ValidationError, ValueError) as e:
+                rows.append(None)
+                errors.append(str(e))
+        return rows, errors
+
+
+class _SurveyWriter:
+    """Serialize the scored rows, chunk after chunk."""
+
+    def __init__(self, format: str):
+        self.format = format
+        self._sink = _StreamSink()
+        self._parquet: pq.ParquetWriter | None = None
+        self._header = True
+
+    def write(self, survey: pd.DataFrame, results: list[dict]) -> bytes:
+        if self.format == "ndjson":
+            records = orjson.loads(survey.to_json(orient="records"))
+            return b"".join(orjson.dumps({**record, **result}) + b"\n"
+                            for record, result in zip(records, results))
+        scored = survey.copy()
+        for column in RESULT_COLUMNS:
+            values = [result.get(column) for result in results]
+            scored[column] = [value if value is None or isinstance(value, str)
+                              else json.dumps(value) for value in values]
+        if self.format == "csv":
+            content = scored.to_csv(index=False, header=self._header).encode()
+            self._header = False
+            return content
+        if self._parquet is None:
+            # the result columns may all be null in the first chunk
+            schema = pa.Schema.from_pandas(scored, preserve_index=False)
+            for column in RESULT_COLUMNS:
+                schema = schema.set(schema.get_field_index(column), pa.field(column, pa.string()))
+            self._parquet = pq.ParquetWriter(self._sink, schema)
+        table = pa.Table.from_pandas(scored, preserve_index=False, schema=self._parquet.schema)
+        self._parquet.write_table(table)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        if self._parquet is None:
+            return b""
+        self._parquet.close()
+        return self._sink.drain()
+
+
+class _StreamSink(io.RawIOBase):
+    """Write-only file whose content is drained as it is written, for the Parquet writer
+    which needs the position in the file."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self) -> None:
+        # the Parquet writer closes its file, the content is still to be drained
+        pass
+
+    def drain(self) -> bytes:
+        content = b"".join(self._chunks)
+        self._chunks = []
+        return content
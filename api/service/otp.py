@@ -0,0 +1,172 @@
+import asyncio
+import inspect
+import logging
+import time
+from typing import Any, Callable, Dict
+from geopandas import GeoDataFrame
+from isochrones import calculate_isochrones, get_available_modes
+from ..executor import run_otp
+from ..config import config
+from ..auth import API_KEYS
+
+
+class OtpError(Exception):
+    """Raised when an OTP call fails: network error, timeout, error response or invalid payload."""
+
+
+class OtpUnavailableError(OtpError):
+    """Raised when OTP calls are rejected because the circuit is open."""
+
+
+class CircuitBreaker:
+    """Fail fast after consecutive failures, then let a single trial call through
+    once the reset timeout has elapsed."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self) -> None:
+        state = self.state
+        if state == "open" or (state == "half-open" and self._trial):
+            raise OtpUnavailableError("OTP is unavailable, retry later")
+        if state == "half-open":
+            self._trial = True
+
+    def on_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def on_cancel(self) -> None:
+        self._trial = False
+
+    def on_failure(self) -> None:
+        self.failures += 1
+        self._trial = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class OtpGateway:
+    """Gateway to the OTP server: bounds the number of concurrent connections,
+    applies a timeout to each call, fails fast when OTP is down and keeps the
+    available modes in memory."""
+
+    def __init__(self):
+        self.otp_url = config.OTP_URL
+        # Use the first API key if available
+        self.api_key = API_KEYS[0] if API_KEYS else None
+        self.breaker = CircuitBreaker(
+            config.OTP_CIRCUIT_FAILURES, config.OTP_CIRCUIT_RESET)
+        self._connections = asyncio.Semaphore(config.OTP_MAX_CONNECTIONS)
+        self._modes = None
+        self._modes_fetched_at = 0.0
+        self._modes_refresh = None
+
+    async def calculate_isochrones(self, **kwargs) -> GeoDataFrame:
+        """Compute isochrones, see isochrones.calculate_isochrones for the arguments
+        (the OTP URL and API key are provided by the gateway)."""
+        return await self._call(
+            calculate_isochrones, lambda result: isinstance(result, GeoDataFrame),
+            otp_url=self.otp_url, api_key=self.api_key, **kwargs)
+
+    async def get_available_modes(self) -> Dict[str, str]:
+        """Get the available transport modes from memory.
+        Stale modes are returned immediately while they are refreshed in the background."""
+        if self._modes is None:
+            await self._refresh_modes()
+        elif time.monotonic() - self._modes_fetched_at >= config.OTP_MODES_EXPIRY:
+            if self._modes_refresh is None or self._modes_refresh.done():
+                self._modes_refresh = asyncio.create_task(
+                    self._refresh_modes())
+        return self._modes
+
+    def stats(self) -> Dict:
+        return {
+            "circuit": self.breaker.state,
+            "failures": self.breaker.failures,
+            "modes_age_sec": time.monotonic() - self._modes_fetched_at if self._modes is not None else None,
+        }
+
+    async def _refresh_modes(self) -> None:
+        try:
+            self._modes = await self._call(
+                get_available_modes, lambda result: isinstance(result, dict) and len(result) > 0,
+                self.otp_url, api_key=self.api_key)
+            self._modes_fetched_at = time.monotonic()
+        except Exception as e:
+            logging.error(e, exc_info=True)
+            if self._modes is None:
+                raise
+
+    async def _call(self, func: Callable, validate: Callable[[Any], bool], *args, **kwargs) -> Any:
+        """Call OTP, counting the network errors, timeouts, error responses and invalid
+        payloads as failures of the circuit. Responses to invalid requests (4xx) are not."""
+        self.breaker.before_call()
+        try:
+            result = await self._run(func, *args, **kwargs)
+            if not validate(result):
+                raise OtpError(f"Invalid OTP response: {type(result).__name__}")
+        except asyncio.CancelledError:
+            self.breaker.on_cancel()
+            raise
+        except OtpError:
+            self.breaker.on_failure()
+            raise
+        except Exception as e:
+            if _is_client_error(e):
+                # OTP did respond, to an invalid request
+                self.breaker.on_success()
+                raise
+            self.breaker.on_failure()
+            raise OtpError(f"OTP call failed: {e}") from e
+        self.breaker.on_success()
+        return result
+
+    async def _run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run the call in the OTP thread pool. Its connection slot is held until the thread
+        finishes, also when the caller stops waiting for it (timeout or cancellation),
+        and the HTTP client is given the same timeout so that the thread does end."""
+        if _accepts_timeout(func):
+            kwargs["timeout"] = config.OTP_TIMEOUT
+        await self._connections.acquire()
+        call = asyncio.ensure_future(run_otp(func, *args, **kwargs))
+        call.add_done_callback(self._on_call_done)
+        try:
+            return await asyncio.wait_for(asyncio.shield(call), timeout=config.OTP_TIMEOUT)
+        except TimeoutError as e:
+            raise OtpError(f"OTP did not respond within {config.OTP_TIMEOUT} seconds") from e
+
+    def _on_call_done(self, call: asyncio.Future) -> None:
+        self._connections.release()
+        if not call.cancelled():
+            # retrieved, also when nobody waits for the call anymore
+            call.exception()
+
+
+def _accepts_timeout(func: Callable) -> bool:
+    """Whether the OTP client function takes an HTTP timeout (seconds)."""
+    try:
+        return "timeout" in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _is_client_error(error: Exception) -> bool:
+    """Whether the error is an OTP response to an invalid request (HTTP 4xx)."""
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return isinstance(status_code, int) and 400 <= status_code < 500
+
+otp = OtpGateway()
@@ -0,0 +1,91 @@
+import io
+import json
+import math
+import pyarrow as pa
+from geopandas import GeoDataFrame
+
+# Version 2: Arrow IPC stream (WKB geometries, columnar properties) with zstd compression,
+# keeping the index (OSM ids) as columns and the nested properties as JSON
+MAGIC = b"POI2"
+# Version 1: same encoding without the index, nested properties turned into JSON strings
+LEGACY_MAGIC = b"POI1"
+
+# Schema metadata: the index columns and the JSON encoded columns
+INDEX_KEY = b"poi:index"
+JSON_KEY = b"poi:json"
+
+WRITE_OPTIONS = pa.ipc.IpcWriteOptions(compression="zstd")
+
+
+def encode(features: GeoDataFrame) -> bytes:
+    """Encode features for the POI cache.
+
+    Args:
+        features (GeoDataFrame): The features.
+
+    Returns:
+        bytes: The versioned binary encoding.
+    """
+    # OSM properties may mix strings with lists or dicts, all the values of these
+    # columns are JSON encoded, so that the strings can be told apart when decoding
+    json_columns = [column for column in features.columns
+                    if column != features.geometry.name and features[column].dtype == object
+                    and not features[column].map(_is_str).all()]
+    index_columns = [name if name is not None else f"__index_level_{i}__"
+                     for i, name in enumerate(features.index.names)]
+    features = features.rename_axis(index_columns).reset_index()
+    for column in json_columns:
+        features[column] = features[column].map(_to_json)
+    table = pa.table(features.to_arrow(index=False))
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           INDEX_KEY: json.dumps(index_columns),
+                                           JSON_KEY: json.dumps(json_columns)})
+    buffer = io.BytesIO()
+    buffer.write(MAGIC)
+    with pa.ipc.new_stream(buffer, table.schema, options=WRITE_OPTIONS) as writer:
+        writer.write_table(table)
+    return buffer.getvalue()
+
+
+def decode(value: bytes | str) -> GeoDataFrame:
+    """Decode features from the POI cache, also reading the previous versions and
+    the legacy GeoJSON entries.
+
+    Args:
+        value (bytes | str): The cached value.
+
+    Returns:
+        GeoDataFrame: The features.
+    """
+    if isinstance(value, bytes) and value.startswith(MAGIC):
+        table = pa.ipc.open_stream(memoryview(value)[len(MAGIC):]).read_all()
+        metadata = table.schema.metadata
+        features = GeoDataFrame.from_arrow(table)
+        for column in json.loads(metadata[JSON_KEY]):
+            features[column] = features[column].map(_from_json)
+        index_columns = json.loads(metadata[INDEX_KEY])
+        features = features.set_index(index_columns)
+        features.index.names = [None if name.startswith("__index_level_") else name
+                                for name in index_columns]
+        return features
+    if isinstance(value, bytes) and value.startswith(LEGACY_MAGIC):
+        table = pa.ipc.open_stream(memoryview(value)[len(LEGACY_MAGIC):]).read_all()
+        return GeoDataFrame.from_arrow(table)
+    # GeoJSON written before the binary encoding
+    return GeoDataFrame.from_features(json.loads(value), crs="EPSG:4326")
+
+
+def _is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _is_str(value) -> bool:
+    return _is_missing(value) or isinstance(value, str)
+
+
+def _to_json(value):
+    return None if _is_missing(value) else json.dumps(value, default=str)
+
+
+def _from_json(value):
+    return None if _is_missing(value) else json.loads(value)
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import shapely
+from geopandas import GeoDataFrame
+from shapely.geometry import box
+from shapely.geometry.base import BaseGeometry
+
+
+class PoiIndex:
+    """In-memory POIs of a cached area, with a spatial index over their geometries."""
+
+    def __init__(self, area: list[float], generation: int, features: dict[str, GeoDataFrame]):
+        """
+        Args:
+            area (list[float]): The cached area [min_lon, min_lat, max_lon, max_lat].
+            generation (int): The POI cache generation of the area the features were loaded from.
+            features (dict[str, GeoDataFrame]): The features by category.
+        """
+        self.area = area
+        self.generation = generation
+        # last time the generation was checked against the cache
+        self.checked_at = 0.0
+        self.categories = set(features.keys())
+        frames = [gdf.assign(category=category) for category, gdf in features.items()
+                  if gdf is not None and not gdf.empty]
+        if frames:
+            self.features = GeoDataFrame(
+                pd.concat(frames)).set_crs("EPSG:4326", allow_override=True)
+        else:
+            self.features = GeoDataFrame(
+                {"category": []}, geometry=[], crs="EPSG:4326")
+        self._category = self.features["category"].to_numpy()
+        self._tree = shapely.STRtree(self.features.geometry.values)
+
+    def query(self, geometry: list[float] | BaseGeometry, categories: list[str] | None = None) -> GeoDataFrame:
+        """Get the features intersecting a bounding box or a geometry.
+
+        Args:
+            geometry (list[float] | BaseGeometry): Bounding box [min_lon, min_lat, max_lon, max_lat] or geometry.
+            categories (list[str] | None, optional): The categories to keep. Defaults to all.
+
+        Returns:
+            GeoDataFrame: The matching features.
+        """
+        if not isinstance(geometry, BaseGeometry):
+            geometry = box(*geometry)
+        positions = self._tree.query(geometry, predicate="intersects")
+        if categories:
+            positions = positions[np.isin(
+                self._category[positions], list(categories))]
+        return self.features.iloc[np.sort(positions)]
+
+    def covers(self, categories: list[str]) -> bool:
+        """Whether all the categories were loaded."""
+        return set(categories).issubset(self.categories)
+
+    def __len__(self) -> int:
+        return len(self.features)
@@ -0,0 +1,224 @@
+"""Local store of the POIs of an OSM PBF extract.
+
+The extract is parsed once, keeping only the features having one of the POI tags,
+and written as an uncompressed Arrow IPC file sorted by latitude band then longitude,
+which is memory-mapped (and so shared by all the workers through the page cache) and
+queried by binary search within each band crossed by the bounding box.
+
+Usage:
+    python -m api.service.poi_store switzerland.osm.pbf [switzerland.osm.pbf.pois.arrow]
+"""
+import argparse
+import logging
+import os
+import re
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyogrio
+from geopandas import GeoDataFrame, GeoSeries
+
+# Layers of the GDAL OSM driver holding POIs
+LAYERS = ["points", "lines", "multipolygons"]
+
+# Tags of the GDAL OSM driver not in a column of their own
+OTHER_TAGS = re.compile(r'"((?:[^"\\]|\\.)*)"=>"((?:[^"\\]|\\.)*)"')
+
+# Index of the queried POIs, as returned by get_osm_features: the OSM element type and id
+INDEX_NAMES = ["element", "id"]
+
+# Height of the latitude bands of the store (degrees, ~1 km)
+BAND_HEIGHT = 0.01
+# Schema metadata holding the band height, missing in the stores sorted by longitude only
+BAND_HEIGHT_KEY = b"poi:band_height"
+
+
+def get_store_path(source: str) -> str:
+    """Get the path of the POI store of an OSM PBF extract, next to it."""
+    return f"{source}.pois.arrow"
+
+
+def ingest(source: str, path: str | None = None, tags: dict[str, list[str]] | None = None) -> int:
+    """Parse an OSM PBF extract and write the POI store.
+
+    Args:
+        source (str): The OSM PBF extract path.
+        path (str | None, optional): The store path. Defaults to next to the extract.
+        tags (dict[str, list[str]] | None, optional): The tag values to keep, by tag key.
+            Defaults to all the OSM_TAGS and CATEGORY_TAGS values.
+
+    Returns:
+        int: The number of POIs written.
+    """
+    path = path or get_store_path(source)
+    tags = tags or get_all_tags()
+    frames = []
+    for layer in LAYERS:
+        gdf = _read_layer(source, layer, tags)
+        logging.info(f"Read {len(gdf)} {layer} from {source}.")
+        frame = _select_pois(gdf, layer, tags)
+        if not frame.empty:
+            frames.append(frame)
+    if frames:
+        pois = GeoDataFrame(pd.concat(frames, ignore_index=True), crs="EPSG:4326")
+    else:
+        pois = GeoDataFrame({"osmid": [], "name": [], **{key: [] for key in tags}},
+                            geometry=[], crs="EPSG:4326")
+    points = pois.geometry.representative_point()
+    table = pa.table({
+        "osmid": pa.array(pois["osmid"], pa.string()),
+        "name": pa.array(pois["name"], pa.string()),
+        **{key: pa.array(pois[key], pa.string()) for key in tags},
+        "x": pa.array(points.x.to_numpy(), pa.float64()),
+        "y": pa.array(points.y.to_numpy(), pa.float64()),
+        "geometry": pa.array(pois.geometry.to_wkb(), pa.binary()),
+    })
+    # sorted by latitude band then longitude, for the binary search of the bounding boxes
+    bands = np.floor(table["y"].to_numpy() / BAND_HEIGHT)
+    table = table.take(np.lexsort((table["x"].to_numpy(), bands)))
+    table = table.replace_schema_metadata({BAND_HEIGHT_KEY: str(BAND_HEIGHT)})
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=len(table) or None)
+    os.replace(tmp_path, path)
+    logging.info(f"Wrote {len(table)} POIs to {path}.")
+    return len(table)
+
+
+def get_all_tags() -> dict[str, list[str]]:
+    """Get all the tag values of the POI categories, by tag key."""
+    from .pois import CATEGORY_TAGS, OSM_TAGS
+    tags: dict[str, list[str]] = {}
+    for category_tags in [OSM_TAGS, *CATEGORY_TAGS.values()]:
+        for key, values in category_tags.items():
+            tags.setdefault(key, [])
+            tags[key].extend(value for value in values if value not in tags[key])
+    return tags
+
+
+def _read_layer(source: str, layer: str, tags: dict[str, list[str]]) -> GeoDataFrame:
+    """Read the features of a layer that may have one of the tags: the filter is applied by
+    GDAL while reading, so that the whole layer is not loaded. The tags not in a column of their
+    own are matched in other_tags (a superset, filtered exactly by _select_pois)."""
+    fields = set(pyogrio.read_info(source, layer=layer)["fields"])
+    conditions = []
+    for key, values in tags.items():
+        if key in fields:
+            conditions.append(f'"{key}" IN ({", ".join(_quote(value) for value in values)})')
+        elif "other_tags" in fields:
+            conditions.extend(f'"other_tags" LIKE {_quote(f"%{_hstore_pair(key, value)}%")}' for value in values)
+    columns = [column for column in ["osm_id", "osm_way_id", "name", "other_tags"] if column in fields]
+    columns.extend(key for key in tags if key in fields)
+    return pyogrio.read_dataframe(source, layer=layer, columns=columns,
+                                  where=" OR ".join(conditions) if conditions else "0 = 1")
+
+
+def _hstore_pair(key: str, value: str) -> str:
+    """Format a tag as in other_tags."""
+    return '"' + key + '"=>"' + value + '"'
+
+
+def _quote(value: str) -> str:
+    """Quote a string literal of an OGR SQL expression."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _select_pois(gdf: GeoDataFrame, layer: str, tags: dict[str, list[str]]) -> GeoDataFrame:
+    """Get the features of a layer having one of the tags, with a column per tag key."""
+    other_tags = gdf["other_tags"] if "other_tags" in gdf.columns else pd.Series(None, index=gdf.index)
+    parsed = other_tags.map(lambda value: dict(OTHER_TAGS.findall(value)) if isinstance(value, str) else {})
+    columns = {}
+    mask = np.zeros(len(gdf), dtype=bool)
+    for key, values in tags.items():
+        column = gdf[key] if key in gdf.columns else parsed.map(lambda t, key=key: t.get(key))
+        column = column.where(column.isin(values))
+        mask |= column.notna().to_numpy()
+        columns[key] = column
+    if layer == "multipolygons":
+        # multipolygons are either relations or closed ways
+        osmid = np.where(gdf["osm_id"].notna(), "relation/" + gdf["osm_id"].astype(str),
+                         "way/" + gdf["osm_way_id"].astype(str))
+    else:
+        osmid = ("node/" if layer == "points" else "way/") + gdf["osm_id"].astype(str)
+    selected = GeoDataFrame({"osmid": osmid, "name": gdf["name"], **columns},
+                            geometry=gdf.geometry.values, crs="EPSG:4326")
+    return selected[mask]
+
+
+class PoiStore:
+    """Memory-mapped POI store, see ingest."""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): The store path.
+        """
+        self.path = path
+        # to reopen the store when it is ingested again
+        self.mtime = os.stat(path).st_mtime_ns
+        self.table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        self._x = self.table["x"].combine_chunks().to_numpy()
+        self._y = self.table["y"].combine_chunks().to_numpy()
+        band_height = (self.table.schema.metadata or {}).get(BAND_HEIGHT_KEY)
+        self.band_height = float(band_height) if band_height else None
+        self._bands = self._get_bands(self._y)
+
+    def query(self, bbox: list[float], tags: dict[str, list[str]]) -> GeoDataFrame:
+        """Get the POIs located in a bounding box (by their representative point), having one of the tags.
+
+        Args:
+            bbox (list[float]): Bounding box [min_lon, min_lat, max_lon, max_lat].
+            tags (dict[str, list[str]]): The tag values, by tag key.
+
+        Returns:
+            GeoDataFrame: The matching POIs, indexed by OSM element type and id,
+            with a column per requested tag key.
+        """
+        # the rows of each band crossed by the bounding box, then within its longitudes
+        bands = np.arange(self._get_bands(bbox[1]), self._get_bands(bbox[3]) + 1)
+        band_starts = np.searchsorted(self._bands, bands, side="left")
+        band_stops = np.searchsorted(self._bands, bands, side="right")
+        ranges = [np.arange(start + np.searchsorted(self._x[start:stop], bbox[0], side="left"),
+                            start + np.searchsorted(self._x[start:stop], bbox[2], side="right"))
+                  for start, stop in zip(band_starts, band_stops)]
+        indices = np.concatenate(ranges) if ranges else np.array([], dtype=np.int64)
+        mask = (self._y[indices] >= bbox[1]) & (self._y[indices] <= bbox[3])
+        rows = self.table.take(indices)
+        tag_mask = np.zeros(len(rows), dtype=bool)
+        for key, values in tags.items():
+            if key in rows.column_names:
+                tag_mask |= pc.fill_null(pc.is_in(rows[key], value_set=pa.array(values, pa.string())),
+                                         False).to_numpy()
+        rows = rows.filter(pa.array(mask & tag_mask))
+        keys = [key for key in tags if key in rows.column_names]
+        df = rows.select(["name", *keys]).to_pandas()
+        osmids = pc.split_pattern(rows["osmid"], "/", max_splits=1)
+        df.index = pd.MultiIndex.from_arrays(
+            [pc.list_element(osmids, 0).to_numpy(zero_copy_only=False),
+             pc.cast(pc.list_element(osmids, 1), pa.int64()).to_numpy()], names=INDEX_NAMES)
+        geometry = GeoSeries.from_wkb(rows["geometry"].to_numpy(zero_copy_only=False), crs="EPSG:4326")
+        return GeoDataFrame(df, geometry=geometry.values, crs="EPSG:4326")
+
+    def _get_bands(self, y: float | np.ndarray) -> np.ndarray:
+        if self.band_height is None:
+            # sorted by longitude only: a single band
+            return np.zeros_like(y, dtype=np.float64)
+        return np.floor(np.asarray(y) / self.band_height)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest an OSM PBF extract in a POI store.")
+    parser.add_argument("source", help="The OSM PBF extract path.")
+    parser.add_argument("path", nargs="?", help="The store path. Defaults to next to the extract.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    ingest(args.source, args.path)
+
+
+if __name__ == "__main__":
+    main()
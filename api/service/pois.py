@@ -1,12 +1,23 @@
+import asyncio
 import logging
-from typing import Dict
+import os
+import time
+import uuid
+from typing import AsyncIterator, Dict
 import pandas as pd
 from geopandas import GeoDataFrame
 from isochrones import get_osm_features
 from ..cache import redis
+from ..executor import run_io, run_cpu
+from .geometry import simplify_geometries
+from .poi_index import PoiIndex
+from .poi_store import PoiStore, get_store_path
+from .frame_cache import FrameCache
+from . import poi_codec
+from .tiles import bbox_tiles, split_by_tile, tiles_bbox
+from ..singleflight import RedisLock, SingleFlight, redis_single_flight
 from ..models.isochrones import FeatureCollection
 from ..config import config
-import hashlib
 import json
 
 OSM_TAGS = {
@@ -282,12 +293,84 @@ CATEGORY_TAGS = {
 }
 
 
+# Incremented whenever the cached POIs of an area change
+GENERATION_KEY = "generation:pois-area:{area}"
+# Namespace of the cache keys of a category, incremented to invalidate them all at once
+NAMESPACE_KEY = "generation:pois:{category}"
+
+# In-memory POI indexes of the cached areas, in this worker
+indexes: Dict[str, PoiIndex] = {}
+index_loads = SingleFlight()
+
+# Decoded tiles and namespaces in this worker, kept up to date with the messages of the
+# invalidation channel while listening to it
+INVALIDATION_CHANNEL = "pois:invalidations"
+frame_cache = FrameCache(config.CACHE_OSM_LRU_BYTES)
+namespaces: Dict[str, int] = {}
+listening = False
+
+# Memory-mapped POI stores of the sources, in this worker
+stores: Dict[str, PoiStore] = {}
+
+# Cache build jobs running in this worker, by job id
+jobs: Dict[str, asyncio.Task] = {}
+# Background refreshes of the stale tiles running in this worker
+refreshes: set[asyncio.Task] = set()
+# Cleanups of the invalidated namespaces running in this worker, by category
+cleanups: Dict[str, asyncio.Task] = {}
+
+
+async def listen_invalidations() -> None:
+    """Keep the decoded tiles and the namespaces of this worker up to date, by listening
+    to the invalidation channel. They are not used while not listening."""
+    global listening
+    while True:
+        try:
+            async with redis.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # what was cached before listening may be outdated
+                frame_cache.clear()
+                namespaces.clear()
+                listening = True
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    invalidation = json.loads(message["data"])
+                    for key in invalidation.get("keys", []):
+                        frame_cache.invalidate(key)
+                    for category in invalidation.get("categories", []):
+                        namespaces.pop(category, None)
+                        frame_cache.invalidate_prefix(f"pois:{category}:")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(e, exc_info=True)
+        finally:
+            listening = False
+        await asyncio.sleep(1)
+
+
+async def stop_cache_jobs() -> None:
+    """Interrupt the cache jobs running in this worker, when it shuts down.
+    They are marked as interrupted, to be resumed."""
+    tasks = list(jobs.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def get_frame_cache_stats() -> Dict:
+    """Get the statistics of the decoded tiles cache of this worker."""
+    return {"listening": listening, **frame_cache.stats()}
+
+
 class PoisService:
     def __init__(self):
         self.areas = json.loads(config.CACHE_OSM_AREAS)
         self.categories = CATEGORY_TAGS.keys()
 
-    async def get_pois(self, bbox: list[float], categories: list[str] = None, source: str = None, cached: bool = False) -> FeatureCollection:
+    async def get_pois(self, bbox: list[float], categories: list[str] = None, source: str = None, cached: bool = False,
+                       tolerance: float = None, precision: int = None) -> Dict:
         """Get available OSM features for isochrone calculations.
         If no bbox or categories are provided, use default from config.
 
@@ -296,116 +379,536 @@ class PoisService:
             categories (list[str], optional): List of OSM categories. Defaults to None.
             source (str, optional): Source of POI data (e.g., 'osm.pbf'). Defaults to None.
             cached (bool, optional): Whether to use cached data. Defaults to False.
+            tolerance (float, optional): Geometry simplification tolerance (degrees). Defaults to None.
+            precision (int, optional): Number of decimals of the coordinates. Defaults to None.
 
         Returns:
-            FeatureCollection: GeoJSON FeatureCollection of OSM features.
+            Dict: GeoJSON FeatureCollection of OSM features, empty if they could not be retrieved.
         """
         try:
-            if cached:
-                area = self._get_area(bbox)
-                if area:
-                    # get cached data for each category and concatenate them
-                    all_features = GeoDataFrame()
-                    for category in categories if categories else self.categories:
-                        features = await self._make_area_category_cache(area, category, source)
-                        if features is not None and not features.empty:
-                            inner_features = features.cx[bbox[0]
-                                :bbox[2], bbox[1]:bbox[3]]
-                            if inner_features is not None and not inner_features.empty:
-                                all_features = pd.concat(
-                                    [all_features, inner_features], ignore_index=True)
-                    if not all_features.empty:
-                        return all_features.__geo_interface__
-                    logging.warning(
-                        "No cached data found. Fetching live data.")
-                else:
-                    logging.warning(
-                        "Bounding box is outside of cached areas. Fetching live data.")
-            else:
-                logging.info("Bypassing cache. Fetching live data.")
-
-            # Fetch live data from OSM
-            features = get_osm_features(
-                bounding_box=tuple(bbox),
-                tags=self._make_tags(
-                    categories if categories else self.categories),
-                crs="EPSG:4326",
-                osm_pbf_path=source
-            )
+            features = await self.get_features(bbox, categories, source, cached)
+            if tolerance is not None or precision is not None:
+                features = await run_cpu(simplify_geometries, features, tolerance, precision)
             return features.__geo_interface__
         except Exception as e:
             logging.error(e, exc_info=True)
-            return FeatureCollection(type="FeatureCollection", features=[], bbox=bbox)
+            return FeatureCollection(type="FeatureCollection", features=[], bbox=bbox).model_dump(exclude_none=True)
+
+    async def get_features(self, bbox: list[float], categories: list[str] = None, source: str = None, cached: bool = False) -> GeoDataFrame:
+        """Get available OSM features for isochrone calculations, as a GeoDataFrame.
+        See get_pois for the arguments.
+
+        Returns:
+            GeoDataFrame: The OSM features.
+        """
+        if cached:
+            area = self._get_area(bbox)
+            if area:
+                index = await self._get_index(area)
+                requested_categories = categories if categories else self.categories
+                if (index is not None and index.covers(requested_categories)
+                        and await self._check_tiles_cache(bbox, requested_categories, source)):
+                    return index.query(bbox, requested_categories)
+            # get cached data of the tiles of all the categories and concatenate them at once
+            categories_features = await self._make_area_categories_cache(
+                bbox, categories if categories else self.categories, source)
+            if all(features is not None for features in categories_features.values()):
+                frames = [features.cx[bbox[0]:bbox[2], bbox[1]:bbox[3]].assign(category=category)
+                          for category, features in categories_features.items() if not features.empty]
+                frames = [frame for frame in frames if not frame.empty]
+                if not frames:
+                    return GeoDataFrame(geometry=[], crs="EPSG:4326")
+                return GeoDataFrame(pd.concat(frames))
+            logging.warning(
+                "Cached data could not be retrieved. Fetching live data.")
+        else:
+            logging.info("Bypassing cache. Fetching live data.")
+
+        # Fetch live data from OSM
+        return await self._fetch_features(bbox, categories if categories else self.categories, source)
 
-    async def delete_cache(self) -> None:
-        """Delete all cached OSM features."""
+    async def _fetch_features(self, bbox: list[float], categories: list[str], source: str | None) -> GeoDataFrame:
+        """Fetch the OSM features of the categories, from the POI store of the source if it
+        was ingested (see poi_store), else from the source or the Overpass API."""
+        tags = self._make_tags(categories)
+        store = self._get_store(source)
+        if store is not None:
+            return await run_io(store.query, bbox, tags)
+        return await run_io(
+            get_osm_features,
+            bounding_box=tuple(bbox),
+            tags=tags,
+            crs="EPSG:4326",
+            osm_pbf_path=source
+        )
+
+    def _get_store(self, source: str | None) -> PoiStore | None:
+        """Get the POI store of a source, opened once per worker and reopened when it is
+        ingested again, None if there is none."""
+        if not source:
+            return None
+        path = get_store_path(source)
+        store = stores.get(path)
         try:
-            keys = await redis.keys("pois:*")
-            if keys:
-                await redis.delete(*keys)
-                logging.info(f"Deleted {len(keys)} cache keys.")
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if store is None or store.mtime != mtime:
+            store = PoiStore(path)
+            stores[path] = store
+            logging.info(f"Opened POI store {path}: {len(store)} features.")
+        return store
+
+    async def delete_cache(self, categories: list[str] | None = None, bbox: list[float] | None = None) -> None:
+        """Delete cached OSM features.
+        Without bounding box, the namespace of the categories is changed so that their cached
+        features are no longer read, and the old keys are removed in the background.
+        With a bounding box, the keys of the tiles covering it are removed.
+
+        Args:
+            categories (list[str] | None, optional): The categories to delete. Defaults to all.
+            bbox (list[float] | None, optional): Bounding box [min_lon, min_lat, max_lon, max_lat]. Defaults to everywhere.
+        """
+        categories = categories if categories else list(self.categories)
+        try:
+            if bbox is None:
+                async with redis.pipeline(transaction=False) as pipe:
+                    for category in categories:
+                        pipe.incr(NAMESPACE_KEY.format(category=category))
+                    for key in self._get_generation_keys():
+                        pipe.incr(key)
+                    pipe.publish(INVALIDATION_CHANNEL, json.dumps({"categories": categories}))
+                    await pipe.execute()
+                for category in categories:
+                    namespaces.pop(category, None)
+                for category in categories:
+                    if category not in cleanups:
+                        task = asyncio.create_task(self._cleanup_cache(category))
+                        cleanups[category] = task
+                        task.add_done_callback(
+                            lambda _, category=category: cleanups.pop(category, None))
+                logging.info(f"Invalidated cache of {categories}.")
             else:
-                logging.info("No cache keys to delete.")
+                tiles = bbox_tiles(bbox, config.CACHE_OSM_TILE_ZOOM)
+                category_namespaces = await self._get_namespaces(categories)
+                keys = [self._make_cache_key(category, category_namespaces[category], tile)
+                        for category in categories for tile in tiles]
+                keys += [f"{key}:fresh" for key in keys]
+                async with redis.pipeline(transaction=False) as pipe:
+                    pipe.unlink(*keys)
+                    for key in self._get_generation_keys(tiles_bbox(tiles)):
+                        pipe.incr(key)
+                    pipe.publish(INVALIDATION_CHANNEL, json.dumps({"keys": keys}))
+                    deleted = (await pipe.execute())[0]
+                logging.info(f"Deleted {deleted} cache keys of {categories} in {bbox}.")
         except Exception as e:
             logging.error(e, exc_info=True)
 
-    async def make_cache(self) -> Dict:
-        """Get available OSM features for isochrone calculations and cache them."""
-        counts = {}
-        for area in self.areas:
-            features = await self._make_area_cache(area)
-            # filter features having a 'variable' column
-            if features is None or features.empty or 'variable' not in features.columns:
-                continue  # No data fetched for this area
-            # count rows in this pandas dataframe grouped by 'variable' column
-            area_counts = features['variable'].value_counts(
-            ).to_dict()
-            for category, count in area_counts.items():
-                counts[category] = counts.get(category, 0) + count
-        return counts
-
-    async def _make_area_cache(self, bbox: list[float], source: str | None) -> GeoDataFrame | None:
-        """Get available OSM features for isochrone calculations and cache them."""
+    async def _cleanup_cache(self, category: str) -> None:
+        """Remove the keys of the old namespaces of a category, incrementally
+        so that Redis is not blocked."""
         try:
-            all_features = GeoDataFrame()
-            for category in self.categories:
-                features = await self._make_area_category_cache(bbox, category, source=source)
-                if features is None or features.empty:
-                    continue  # No data fetched for this category
-                all_features = pd.concat(
-                    [all_features, features], ignore_index=True)
-            return all_features
+            deleted = 0
+            async for keys in self._scan_batches(f"pois:{category}:*"):
+                namespace = str((await self._get_namespaces([category], cached=False))[category])
+                old_keys = [key for key in keys
+                            if key.decode().split(":")[2] != namespace]
+                if old_keys:
+                    deleted += await redis.unlink(*old_keys)
+            logging.info(f"Removed {deleted} old {category} cache keys.")
         except Exception as e:
             logging.error(e, exc_info=True)
+
+    async def _scan_batches(self, pattern: str, count: int = 1000) -> AsyncIterator[list[bytes]]:
+        cursor = 0
+        while True:
+            cursor, keys = await redis.scan(cursor, match=pattern, count=count)
+            if keys:
+                yield keys
+            if cursor == 0:
+                break
+
+    async def start_cache_job(self, job_id: str | None = None, source: str | None = None) -> Dict:
+        """Build the cache of the configured areas and categories in the background.
+        The progress of each (area, category) pair is recorded in the cache, so that
+        an interrupted job can be resumed, skipping the pairs already built.
+        A job runs in a single worker at a time, see make_cache.
+
+        Args:
+            job_id (str | None, optional): The job to resume. Defaults to a new job.
+            source (str | None, optional): Source of POI data (e.g., 'osm.pbf') of a new job. Defaults to None.
+
+        Returns:
+            Dict: The job progress, see get_cache_job.
+        """
+        if job_id is None:
+            job_id = uuid.uuid4().hex
+            await redis.hset(self._make_job_key(job_id), mapping={
+                "status": "pending",
+                "source": source or "",
+                "total": len(self.areas) * len(self.categories),
+                "created_at": time.time(),
+            })
+            await redis.expire(self._make_job_key(job_id), config.CACHE_OSM_JOB_EXPIRY)
+        elif not await redis.exists(self._make_job_key(job_id)):
+            raise ValueError(f"Unknown cache job: {job_id}")
+        if job_id not in jobs:
+            task = asyncio.create_task(self.make_cache(job_id))
+            jobs[job_id] = task
+            task.add_done_callback(lambda _: jobs.pop(job_id, None))
+        return await self.get_cache_job(job_id)
+
+    async def get_cache_job(self, job_id: str) -> Dict | None:
+        """Get the progress of a cache build job.
+
+        Args:
+            job_id (str): The job id.
+
+        Returns:
+            Dict | None: The job status, the number of (area, category) pairs built and failed
+            and the number of features by category, None if the job is unknown.
+        """
+        job = await redis.hgetall(self._make_job_key(job_id))
+        if not job:
             return None
+        job = {field.decode(): value.decode() for field, value in job.items()}
+        if job["status"] == "running" and not await redis.exists(self._make_job_lock_key(job_id)):
+            # the worker running the job died without marking it
+            job["status"] = "interrupted"
+        done = 0
+        counts = {}
+        errors = []
+        for field, value in job.items():
+            if not field.startswith("pair:"):
+                continue
+            _, area, category = field.split(":", 2)
+            if value == "error":
+                errors.append({"area": self.areas[int(area)], "category": category})
+            else:
+                done += 1
+                counts[category] = counts.get(category, 0) + int(value)
+        return {
+            "job_id": job_id,
+            "status": job["status"],
+            "total": int(job["total"]),
+            "done": done,
+            "failed": len(errors),
+            "counts": counts,
+            "errors": errors,
+        }
+
+    async def make_cache(self, job_id: str) -> None:
+        """Get available OSM features for isochrone calculations and cache them,
+        for each (area, category) pair not yet built by the job.
+        The job is locked while running, with a lease renewed by a heartbeat, so that
+        it is not resumed twice: the lock expires if the worker dies.
+
+        Args:
+            job_id (str): The job id.
+        """
+        job_key = self._make_job_key(job_id)
+        lock = RedisLock(self._make_job_lock_key(job_id), config.CACHE_OSM_JOB_LEASE)
+        if not await lock.acquire():
+            logging.info(f"Cache job {job_id} is already running.")
+            return
+        heartbeat = asyncio.create_task(self._renew_job_lock(lock))
+        try:
+            job = await redis.hgetall(job_key)
+            source = job.get(b"source", b"").decode() or None
+            built = {field.decode() for field, value in job.items()
+                     if field.startswith(b"pair:") and value != b"error"}
+            await redis.hset(job_key, "status", "running")
+            semaphore = asyncio.Semaphore(config.CACHE_OSM_BUILD_CONCURRENCY)
+
+            async def build(index: int, area: list[float], category: str) -> bool:
+                field = f"pair:{index}:{category}"
+                if field in built:
+                    return True
+                async with semaphore:
+                    features = await self._make_area_category_cache(area, category, source)
+                if features is None:
+                    await redis.hset(job_key, field, "error")
+                    return False
+                # count the features of the area only, not of the tiles covering it
+                count = 0 if features.empty else len(
+                    features.cx[area[0]:area[2], area[1]:area[3]])
+                await redis.hset(job_key, field, count)
+                return True
+
+            results = await asyncio.gather(*[build(index, area, category)
+                                             for index, area in enumerate(self.areas)
+                                             for category in self.categories])
+            status = "done" if all(results) else "failed"
+            await redis.hset(job_key, "status", status)
+            logging.info(f"Cache job {job_id} {status}.")
+        except asyncio.CancelledError:
+            await redis.hset(job_key, "status", "interrupted")
+            logging.info(f"Cache job {job_id} interrupted.")
+            raise
+        except Exception as e:
+            logging.error(e, exc_info=True)
+            await redis.hset(job_key, "status", "failed")
+        finally:
+            heartbeat.cancel()
+            await lock.release()
+
+    async def _renew_job_lock(self, lock: RedisLock) -> None:
+        while True:
+            await asyncio.sleep(lock.lease / 3)
+            try:
+                if not await lock.extend():
+                    logging.warning(f"Lost the lock {lock.key}.")
+            except Exception as e:
+                logging.error(e, exc_info=True)
 
     async def _make_area_category_cache(self, bbox: list[float], category: str, source: str | None) -> GeoDataFrame | None:
-        """Get available OSM features for a specific category and cache them."""
+        """Get available OSM features for a specific category, see _make_area_categories_cache."""
+        return (await self._make_area_categories_cache(bbox, [category], source))[category]
+
+    async def _make_area_categories_cache(self, bbox: list[float], categories: list[str],
+                                          source: str | None) -> Dict[str, GeoDataFrame | None]:
+        """Get available OSM features for the categories, from the cached tiles covering
+        the bounding box, read at once. The missing tiles of each category are fetched
+        at once and cached, the stale tiles are served and refreshed in the background.
+
+        Returns:
+            Dict[str, GeoDataFrame | None]: The features of the tiles (not clipped to the bounding box)
+            by category, None if they could not be retrieved.
+        """
+        categories = list(categories)
+        try:
+            tiles = bbox_tiles(bbox, config.CACHE_OSM_TILE_ZOOM)
+            category_namespaces = await self._get_namespaces(categories)
+            frames = {category: [] for category in categories}
+            missing_tiles = {category: [] for category in categories}
+            stale_tiles = {category: [] for category in categories}
+            # Check which tiles are already decoded in this worker
+            read_tiles = []
+            for category in categories:
+                for tile in tiles:
+                    cache_key = self._make_cache_key(category, category_namespaces[category], tile)
+                    frame = frame_cache.get(cache_key, max_age=config.CACHE_OSM_FRESH) if listening else None
+                    if frame is not None:
+                        frames[category].append(frame)
+                    else:
+                        read_tiles.append((category, tile, cache_key))
+            if read_tiles:
+                # Check which tiles are already cached, and still fresh, in a single round trip
+                read_keys = [cache_key for _, _, cache_key in read_tiles]
+                generation = frame_cache.generation
+                cached_data = await redis.mget(read_keys + [f"{key}:fresh" for key in read_keys])
+                cached = [(category, tile, cache_key, data, fresh) for (category, tile, cache_key), data, fresh
+                          in zip(read_tiles, cached_data[:len(read_tiles)], cached_data[len(read_tiles):]) if data]
+                decoded = await asyncio.gather(*[run_io(poi_codec.decode, data) for _, _, _, data, _ in cached])
+                for (category, tile, cache_key, _, fresh), frame in zip(cached, decoded):
+                    frames[category].append(frame)
+                    if not fresh:
+                        stale_tiles[category].append(tile)
+                    elif listening:
+                        frame_cache.put(cache_key, frame, float(fresh), generation)
+                cached_tiles = {(category, tile) for category, tile, _, _, _ in cached}
+                for category, tile, _ in read_tiles:
+                    if (category, tile) not in cached_tiles:
+                        missing_tiles[category].append(tile)
+            self._schedule_refreshes(stale_tiles, category_namespaces, source)
+            logging.info(f"Cache hit for {len(tiles) * len(categories) - sum(map(len, missing_tiles.values()))}/"
+                         f"{len(tiles) * len(categories)} tiles of {categories}.")
+
+            async def fill(category: str) -> GeoDataFrame | None:
+                try:
+                    if missing_tiles[category]:
+                        frames[category].extend((await self._fill_tiles_cache(
+                            missing_tiles[category], category, category_namespaces[category], source)).values())
+                    category_frames = [frame for frame in frames[category] if not frame.empty]
+                    if not category_frames:
+                        return GeoDataFrame(geometry=[], crs="EPSG:4326")
+                    return GeoDataFrame(pd.concat(category_frames))
+                except Exception as e:
+                    logging.error(e, exc_info=True)
+                    return None
+            return dict(zip(categories, await asyncio.gather(*[fill(category) for category in categories])))
+        except Exception as e:
+            logging.error(e, exc_info=True)
+            return {category: None for category in categories}
+
+    async def _check_tiles_cache(self, bbox: list[float], categories: list[str], source: str | None) -> bool:
+        """Check that the cached tiles covering the bounding box have not expired, in a single
+        round trip, before serving them from the in-memory index of their area.
+        The stale tiles are refreshed in the background.
+
+        Returns:
+            bool: Whether all the tiles are still cached.
+        """
+        categories = list(categories)
+        tiles = bbox_tiles(bbox, config.CACHE_OSM_TILE_ZOOM)
+        category_namespaces = await self._get_namespaces(categories)
+        async with redis.pipeline(transaction=False) as pipe:
+            for category in categories:
+                for tile in tiles:
+                    cache_key = self._make_cache_key(category, category_namespaces[category], tile)
+                    pipe.exists(cache_key)
+                    pipe.exists(f"{cache_key}:fresh")
+            results = await pipe.execute()
+        stale_tiles = {category: [] for category in categories}
+        for i, (category, tile) in enumerate((category, tile) for category in categories for tile in tiles):
+            cached, fresh = results[2 * i], results[2 * i + 1]
+            if not cached:
+                return False
+            if not fresh:
+                stale_tiles[category].append(tile)
+        self._schedule_refreshes(stale_tiles, category_namespaces, source)
+        return True
+
+    def _schedule_refreshes(self, stale_tiles: Dict[str, list[tuple[int, int, int]]],
+                            category_namespaces: Dict[str, int], source: str | None) -> None:
+        """Refresh the stale tiles of each category in the background."""
+        for category, category_tiles in stale_tiles.items():
+            if category_tiles:
+                task = asyncio.create_task(self._refresh_tiles_cache(
+                    category_tiles, category, category_namespaces[category], source))
+                refreshes.add(task)
+                task.add_done_callback(refreshes.discard)
+
+    async def _fill_tiles_cache(self, tiles: list[tuple[int, int, int]], category: str, namespace: int,
+                                source: str | None) -> Dict[tuple[int, int, int], GeoDataFrame]:
+        """Fetch and cache the missing tiles of a category, making sure each tile is fetched
+        by a single worker: the tiles locked by this worker are fetched at once, the others
+        are awaited until they are cached, or fetched if their lock expires."""
+        locks = {}
+        tiles_features = {}
+        try:
+            locks = await self._acquire_tile_locks(tiles, category, namespace, "fill", config.CACHE_OSM_FILL_LEASE)
+            if locks:
+                tiles_features.update(await self._make_tiles_cache(list(locks), category, namespace, source))
+        finally:
+            for lock in locks.values():
+                await lock.release()
+
+        async def wait_tile(tile: tuple[int, int, int]) -> GeoDataFrame:
+            cache_key = self._make_cache_key(category, namespace, tile)
+
+            async def get_result() -> GeoDataFrame | None:
+                data = await redis.get(cache_key)
+                return await run_io(poi_codec.decode, data) if data else None
+
+            async def compute() -> GeoDataFrame:
+                return (await self._make_tiles_cache([tile], category, namespace, source))[tile]
+            return await redis_single_flight(f"{cache_key}:fill", get_result, compute,
+                                             lease=config.CACHE_OSM_FILL_LEASE, timeout=config.CACHE_OSM_FILL_LEASE)
+        waiting_tiles = [tile for tile in tiles if tile not in locks]
+        if waiting_tiles:
+            logging.info(f"Waiting for {len(waiting_tiles)} {category} tiles fetched by another worker.")
+            tiles_features.update(zip(waiting_tiles, await asyncio.gather(*[wait_tile(tile) for tile in waiting_tiles])))
+        return tiles_features
+
+    async def _make_tiles_cache(self, tiles: list[tuple[int, int, int]], category: str, namespace: int,
+                                source: str | None) -> Dict[tuple[int, int, int], GeoDataFrame]:
+        """Fetch the OSM features of a category for the tiles, with a single request
+        covering all of them, and cache them per tile (including the empty tiles)."""
+        bbox = tiles_bbox(tiles)
+        logging.info(f"Fetching data of {len(tiles)} {category} tiles...")
+        features = await self._fetch_features(bbox, [category], source)
+        tiles_features = split_by_tile(features, tiles)
+        # Store the fetched data in the cache with an expiry time, and a flag
+        # telling that it is fresh, holding when it was written
+        async with redis.pipeline(transaction=False) as pipe:
+            for tile, tile_features in tiles_features.items():
+                cache_key = self._make_cache_key(category, namespace, tile)
+                pipe.set(cache_key, poi_codec.encode(tile_features), ex=config.CACHE_OSM_EXPIRY)
+                pipe.set(f"{cache_key}:fresh", time.time(), ex=config.CACHE_OSM_FRESH)
+            for key in self._get_generation_keys(bbox):
+                pipe.incr(key)
+            pipe.publish(INVALIDATION_CHANNEL, json.dumps(
+                {"keys": [self._make_cache_key(category, namespace, tile) for tile in tiles]}))
+            await pipe.execute()
+        return tiles_features
+
+    async def _refresh_tiles_cache(self, tiles: list[tuple[int, int, int]], category: str, namespace: int,
+                                   source: str | None) -> None:
+        """Refresh the stale tiles of a category, unless another worker is already refreshing them.
+        The locks of a failed refresh are kept until their lease expires, so that it is not
+        retried by every request meanwhile."""
+        locks = {}
+        try:
+            locks = await self._acquire_tile_locks(
+                tiles, category, namespace, "refresh", config.CACHE_OSM_REFRESH_LEASE)
+            if locks:
+                logging.info(f"Refreshing {len(locks)} stale {category} tiles.")
+                await self._make_tiles_cache(list(locks), category, namespace, source)
+        except Exception as e:
+            logging.error(e, exc_info=True)
+            locks = {}
+        finally:
+            for lock in locks.values():
+                await lock.release()
+
+    async def _acquire_tile_locks(self, tiles: list[tuple[int, int, int]], category: str, namespace: int,
+                                  name: str, lease: float) -> Dict[tuple[int, int, int], RedisLock]:
+        """Acquire the locks of the tiles in a single round trip.
+
+        Returns:
+            Dict[tuple[int, int, int], RedisLock]: The acquired locks, by tile.
+        """
+        candidates = {tile: RedisLock(f"{self._make_cache_key(category, namespace, tile)}:{name}", lease)
+                      for tile in tiles}
+        async with redis.pipeline(transaction=False) as pipe:
+            for lock in candidates.values():
+                pipe.set(lock.key, lock.token, nx=True, px=int(lock.lease * 1000))
+            acquired = await pipe.execute()
+        return {tile: lock for (tile, lock), ok in zip(candidates.items(), acquired) if ok}
+
+    async def load_indexes(self) -> None:
+        """Load the in-memory POI indexes of the cached areas."""
+        for area in self.areas:
+            await self._get_index(area)
+
+    async def _get_index(self, area: list[float]) -> PoiIndex | None:
+        """Get the in-memory POI index of a cached area, (re)loading it from the cache
+        when the cache generation of the area has changed.
+
+        Args:
+            area (list[float]): The cached area [min_lon, min_lat, max_lon, max_lat].
+
+        Returns:
+            PoiIndex | None: The index, None if it could not be loaded.
+        """
+        key = self._make_area_key(area)
+        index = indexes.get(key)
+        now = time.monotonic()
+        if index is not None and now - index.checked_at < config.CACHE_OSM_INDEX_CHECK:
+            return index
         try:
-            cache_key = self._make_cache_key(bbox, category)
-            # Check if the data is already cached
-            cached_data_json_str = await redis.get(cache_key)
-            if cached_data_json_str:
-                logging.info(f"Cache hit for key: {cache_key}")
-                # json string to dict
-                cached_data = json.loads(cached_data_json_str)
-                return GeoDataFrame.from_features(cached_data)
-            logging.info(f"Cache miss for key: {cache_key}. Fetching data...")
-            features = get_osm_features(
-                bounding_box=tuple(bbox),
-                tags=self._make_tags([category]),
-                crs="EPSG:4326",
-                osm_pbf_path=source)
-            if features is None or features.empty:
-                return None  # No data fetched for this category
-            # Store the fetched data in the cache with an expiry time
-            await redis.set(cache_key,
-                            features.to_json(), ex=config.CACHE_OSM_EXPIRY)
-            return features
+            generation = int(await redis.get(GENERATION_KEY.format(area=key)) or 0)
+            if index is None or index.generation != generation:
+                index = await index_loads.do(key, lambda: self._load_index(area, generation))
+                indexes[key] = index
+            index.checked_at = now
+            return index
         except Exception as e:
             logging.error(e, exc_info=True)
             return None
 
+    async def _load_index(self, area: list[float], generation: int) -> PoiIndex:
+        """Load the cached features of an area in an in-memory POI index.
+        Only the categories having all the tiles of the area cached are loaded."""
+        tiles = bbox_tiles(area, config.CACHE_OSM_TILE_ZOOM)
+        features = {}
+        categories = list(self.categories)
+        category_namespaces = await self._get_namespaces(categories)
+        cached_data = await redis.mget([self._make_cache_key(category, category_namespaces[category], tile)
+                                        for category in categories for tile in tiles])
+        for i, category in enumerate(categories):
+            category_data = cached_data[i * len(tiles):(i + 1) * len(tiles)]
+            if all(category_data):
+                frames = await asyncio.gather(*[run_io(poi_codec.decode, data) for data in category_data])
+                frames = [frame for frame in frames if not frame.empty]
+                features[category] = GeoDataFrame(pd.concat(frames)) if frames else None
+        # building the spatial index releases the GIL
+        index = await run_io(PoiIndex, area, generation, features)
+        logging.info(
+            f"Loaded POI index of area {area} (generation {generation}): {len(index)} features.")
+        return index
+
     def _make_tags(self, categories: list[str]) -> Dict[str, bool]:
         tags = {}
         for category in categories:
@@ -425,18 +928,62 @@ class PoisService:
         logging.debug(f"Using OSM tags: {tags}")
         return tags
 
-    def _make_cache_key(self, bbox: list[float], category: str) -> str:
-        """Create a cache key for the given category and the current bounding box.
+    async def _get_namespaces(self, categories: list[str], cached: bool = True) -> Dict[str, int]:
+        """Get the current namespace of the cache keys of each category.
+
+        Args:
+            categories (list[str]): The categories.
+            cached (bool, optional): Whether to use the namespaces known by this worker
+                while listening to the invalidation channel. Defaults to True.
+
+        Returns:
+            Dict[str, int]: The namespace of each category.
+        """
+        categories = list(categories)
+        if cached and listening and all(category in namespaces for category in categories):
+            return {category: namespaces[category] for category in categories}
+        values = await redis.mget([NAMESPACE_KEY.format(category=category) for category in categories])
+        current = {category: int(value or 0) for category, value in zip(categories, values)}
+        if listening:
+            namespaces.update(current)
+        return current
+
+    def _make_cache_key(self, category: str, namespace: int, tile: tuple[int, int, int]) -> str:
+        """Create a cache key for the given category and tile.
 
         Args:
             category (str): The category to include in the cache key.
+            namespace (int): The current namespace of the category.
+            tile (tuple[int, int, int]): The tile (zoom, x, y).
 
         Returns:
             str: The generated cache key.
         """
-        bbox_str = ",".join(map(str, bbox))
-        cache_string = f"{category}:{bbox_str}"
-        return f"pois:{hashlib.md5(cache_string.encode()).hexdigest()}"
+        zoom, x, y = tile
+        return f"pois:{category}:{namespace}:{zoom}:{x}:{y}"
+
+    def _make_area_key(self, area: list[float]) -> str:
+        return ",".join(map(str, area))
+
+    def _get_generation_keys(self, bbox: list[float] | None = None) -> list[str]:
+        """Get the generation keys of the areas intersecting the bounding box.
+
+        Args:
+            bbox (list[float] | None, optional): Bounding box [min_lon, min_lat, max_lon, max_lat]. Defaults to everywhere.
+
+        Returns:
+            list[str]: The generation keys of the areas.
+        """
+        return [GENERATION_KEY.format(area=self._make_area_key(area)) for area in self.areas
+                if bbox is None or (bbox[0] <= area[2] and bbox[2] >= area[0]
+                                    and bbox[1] <= area[3] and bbox[3] >= area[1])]
+
+    def _make_job_key(self, job_id: str) -> str:
+        # outside of the pois:* namespace, not to be deleted with the cache
+        return f"pois-jobs:{job_id}"
+
+    def _make_job_lock_key(self, job_id: str) -> str:
+        return f"pois-jobs:{job_id}:lock"
 
     def _get_area(self, bbox: list[float]) -> list[float] | None:
         """Get the area that includes the bounding box.
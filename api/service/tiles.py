@@ -0,0 +1,91 @@
+import math
+import numpy as np
+from geopandas import GeoDataFrame
+
+# Web Mercator latitude limit
+MAX_LATITUDE = 85.0511287798
+
+
+def lonlat_to_tile(lon: np.ndarray | float, lat: np.ndarray | float, zoom: int) -> tuple[np.ndarray, np.ndarray]:
+    """Get the slippy map tile x/y indices containing the points.
+
+    Args:
+        lon (np.ndarray | float): Longitudes.
+        lat (np.ndarray | float): Latitudes.
+        zoom (int): The zoom level.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The tile x and y indices.
+    """
+    n = 2 ** zoom
+    lat = np.radians(np.clip(lat, -MAX_LATITUDE, MAX_LATITUDE))
+    x = np.floor((np.asarray(lon) + 180.0) / 360.0 * n)
+    y = np.floor((1.0 - np.arcsinh(np.tan(lat)) / math.pi) / 2.0 * n)
+    return np.clip(x, 0, n - 1).astype(int), np.clip(y, 0, n - 1).astype(int)
+
+
+def tile_bounds(tile: tuple[int, int, int]) -> list[float]:
+    """Get the bounding box of a tile.
+
+    Args:
+        tile (tuple[int, int, int]): The tile (zoom, x, y).
+
+    Returns:
+        list[float]: Bounding box [min_lon, min_lat, max_lon, max_lat].
+    """
+    zoom, x, y = tile
+    n = 2 ** zoom
+
+    def lat(y: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    return [x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)]
+
+
+def bbox_tiles(bbox: list[float], zoom: int) -> list[tuple[int, int, int]]:
+    """Get the tiles covering a bounding box.
+
+    Args:
+        bbox (list[float]): Bounding box [min_lon, min_lat, max_lon, max_lat].
+        zoom (int): The zoom level.
+
+    Returns:
+        list[tuple[int, int, int]]: The tiles (zoom, x, y).
+    """
+    min_x, min_y = lonlat_to_tile(bbox[0], bbox[3], zoom)
+    max_x, max_y = lonlat_to_tile(bbox[2], bbox[1], zoom)
+    return [(zoom, x, y) for x in range(int(min_x), int(max_x) + 1)
+            for y in range(int(min_y), int(max_y) + 1)]
+
+
+def tiles_bbox(tiles: list[tuple[int, int, int]]) -> list[float]:
+    """Get the bounding box of a set of tiles.
+
+    Args:
+        tiles (list[tuple[int, int, int]]): The tiles (zoom, x, y).
+
+    Returns:
+        list[float]: Bounding box [min_lon, min_lat, max_lon, max_lat].
+    """
+    bounds = [tile_bounds(tile) for tile in tiles]
+    return [min(b[0] for b in bounds), min(b[1] for b in bounds),
+            max(b[2] for b in bounds), max(b[3] for b in bounds)]
+
+
+def split_by_tile(features: GeoDataFrame | None, tiles: list[tuple[int, int, int]]) -> dict[tuple[int, int, int], GeoDataFrame]:
+    """Split features by the tile containing their representative point.
+
+    Args:
+        features (GeoDataFrame | None): The features.
+        tiles (list[tuple[int, int, int]]): The tiles to keep, all at the same zoom level.
+
+    Returns:
+        dict[tuple[int, int, int], GeoDataFrame]: The features of each tile, empty if it has none.
+    """
+    if features is None:
+        features = GeoDataFrame(geometry=[], crs="EPSG:4326")
+    if features.empty:
+        return {tile: features for tile in tiles}
+    zoom = tiles[0][0]
+    points = features.geometry.representative_point()
+    xs, ys = lonlat_to_tile(points.x.to_numpy(), points.y.to_numpy(), zoom)
+    return {tile: features[(xs == tile[1]) & (ys == tile[2])] for tile in tiles}
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+from .cache import redis
+
+T = TypeVar("T")
+
+# Delete the lock only if it is still owned by the caller
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Extend the lease only if the lock is still owned by the caller
+EXTEND_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key onto a single in-flight execution."""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        """Run the function, or wait for the one already running with the same key.
+
+        Args:
+            key (str): The key identifying identical calls.
+            func (Callable[[], Awaitable[T]]): The function to run.
+
+        Returns:
+            T: The shared result.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            # Run as a task so that a cancelled caller does not cancel the waiters
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task)
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+class RedisLock:
+    """Lock shared by all the workers, with a lease so that it is released when its holder dies."""
+
+    def __init__(self, key: str, lease: float):
+        self.key = key
+        self.lease = lease
+        self.token = uuid.uuid4().hex
+
+    async def acquire(self) -> bool:
+        return bool(await redis.set(self.key, self.token, nx=True, px=int(self.lease * 1000)))
+
+    async def release(self) -> None:
+        try:
+            await redis.eval(RELEASE_SCRIPT, 1, self.key, self.token)
+        except Exception as e:
+            # The lease will expire anyway
+            logging.error(e, exc_info=True)
+
+    async def extend(self) -> bool:
+        """Renew the lease, False if the lock is no longer owned."""
+        return bool(await redis.eval(EXTEND_SCRIPT, 1, self.key, self.token, int(self.lease * 1000)))
+
+    async def locked(self) -> bool:
+        return bool(await redis.exists(self.key))
+
+
+async def redis_single_flight(lock_key: str,
+                              get_result: Callable[[], Awaitable[Optional[T]]],
+                              compute: Callable[[], Awaitable[T]],
+                              lease: float,
+                              timeout: float,
+                              poll_interval: float = 0.1) -> T:
+    """Make sure only one worker computes a result that all workers are waiting for.
+    The worker holding the lock computes and stores the result, the others poll
+    for it until it is available, the lock is released or the timeout is reached.
+
+    Args:
+        lock_key (str): The Redis key of the lock.
+        get_result (Callable[[], Awaitable[Optional[T]]]): Read the stored result, None if not available.
+        compute (Callable[[], Awaitable[T]]): Compute and store the result.
+        lease (float): The lock lease (seconds), should exceed the computation time.
+        timeout (float): The maximum time to wait for another worker (seconds).
+        poll_interval (float, optional): The delay between result checks (seconds).
+
+    Returns:
+        T: The result.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        result = await get_result()
+        if result is not None:
+            return result
+        lock = RedisLock(lock_key, lease)
+        if await lock.acquire():
+            try:
+                return await compute()
+            finally:
+                await lock.release()
+        # Another worker is computing, wait for its result
+        while await lock.locked():
+            if loop.time() >= deadline:
+                logging.warning(
+                    f"Timeout waiting for lock: {lock_key}. Computing anyway.")
+                return await compute()
+            await asyncio.sleep(poll_interval)
+            result = await get_result()
+            if result is not None:
+                return result
+        # The lock was released without a result (failure or expired lease), try again
@@ -1,134 +1,235 @@
 import logging
-from typing import Dict, Optional
-from fastapi import APIRouter, Security
+from typing import AsyncIterator, Dict, List
+from fastapi import APIRouter, Header, HTTPException, Query, Response, Security, status
+from fastapi.responses import StreamingResponse
 from ..auth import get_api_key
-from isochrones import calculate_isochrones, get_available_modes, intersect_isochrones
-from ..service.pois import PoisService
-from ..models.isochrones import IsochronePoisData, IsochroneResponse, FeatureCollection, PoisData
+from ..service.pois import PoisService, get_frame_cache_stats
+from ..service.isochrones import IsochronesService
+from ..service.otp import otp, OtpError
+from ..service.geometry import get_tolerance, simplify_geometries
+from ..service.formats import BINARY_RESPONSES, FORMATS, concat_layers, negotiate_format, to_bytes
+from ..executor import run_cpu
+from ..responses import GeoJSONResponse, dumps
 from ..config import config
-from ..auth import API_KEYS
-from datetime import datetime
-import geopandas as gpd
+from ..models.isochrones import AccessibilityData, AccessibilityResponse, IsochronePoisData, IsochroneBatchData, IsochroneResponse, FeatureCollection, PoisData
 
 router = APIRouter()
 
 
+def raise_binary_error(e: Exception) -> None:
+    """Respond to a failed binary format request with an error status."""
+    if isinstance(e, OtpError):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
 @router.get("/modes", response_model=Dict[str, str], response_model_exclude_none=True)
 async def get_modes(api_key: str = Security(get_api_key)) -> Dict[str, str]:
-    otp_url = config.OTP_URL
-    # Use the first API key if available
-    api_key = API_KEYS[0] if API_KEYS else None
-    available_modes = get_available_modes(otp_url, api_key=api_key)
-    return available_modes
+    try:
+        return await otp.get_available_modes()
+    except OtpError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
 
 
-@router.post("/compute", response_model=IsochroneResponse, response_model_exclude_none=True)
+@router.post("/compute", response_model=IsochroneResponse, response_model_exclude_none=True, responses=BINARY_RESPONSES)
 async def compute_isochrones(
     data: IsochronePoisData,
+    format: str | None = Query(
+        None, description=f"Output format, one of {', '.join(FORMATS)}. Binary formats hold both layers, see the 'layer' column."),
+    accept: str | None = Header(None),
     api_key: str = Security(get_api_key),
 ) -> IsochroneResponse:
     """Compute isochrones and points of interest based on the provided data."""
-    otp_url = config.OTP_URL
-    # Use the first API key if available
-    api_key = API_KEYS[0] if API_KEYS else None
-    # parse datetime in ISO 8601 format into an object
-    datetime_obj = datetime.fromisoformat(data.datetime)
+    output_format = negotiate_format(format, accept)
+    if output_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE, detail=f"Unsupported format: {format}")
     try:
-        isochrones = calculate_isochrones(
-            lat=data.lat,
-            lon=data.lon,
-            cutoffSec=data.cutoffSec,
-            date_time=datetime_obj,
-            mode=data.mode if hasattr(data, 'mode') else 'WALK',
-            otp_url=otp_url,
-            api_key=api_key,
-            bike_speed=data.bikeSpeed if hasattr(data, 'bikeSpeed') else 13.0,
-            router='default',
-            overlap=data.overlap,
-        )
-        if data.categories is None or len(data.categories) == 0:
-            return IsochroneResponse(isochrones=isochrones.__geo_interface__, pois=None)
-
-        # Calculate bounding box from isochrones
-        if "bbox" in isochrones.__geo_interface__:
-            bbox = isochrones.__geo_interface__["bbox"]
-        else:
-            all_coords = [feature.geometry['coordinates']
-                          for feature in isochrones.features]
-            lons = [coord[0] for coords in all_coords for coord in (
-                coords if isinstance(coords[0], list) else [coords])]
-            lats = [coord[1] for coords in all_coords for coord in (
-                coords if isinstance(coords[0], list) else [coords])]
-            bbox = [min(lons), min(lats), max(lons), max(lats)]
-
-        try:
-            # Fetch OSM features within the bounding box
-            tags: Dict[str, bool] = {
-                category: True for category in data.categories}
-            pois_service = PoisService()
-            pois = await pois_service.get_pois(bbox=bbox, categories=data.categories)
-            if pois is None or pois.get("features") is None or len(pois.get("features")) == 0:
-                return IsochroneResponse(isochrones=isochrones.__geo_interface__, pois=None)
-
-            # Intersect isochrones with POIs
-            pois_gdf = gpd.GeoDataFrame.from_features(pois)
-            intersected_pois = intersect_isochrones(isochrones, pois_gdf)
-            if intersected_pois is None or intersected_pois.empty:
-                return IsochroneResponse(isochrones=isochrones.__geo_interface__, pois=None)
-        except Exception as e:
-            logging.error(e, exc_info=True)
-            return IsochroneResponse(isochrones=isochrones.__geo_interface__, pois=None)
-
-        return IsochroneResponse(isochrones=isochrones.__geo_interface__, pois=intersected_pois.__geo_interface__)
+        if output_format != "geojson":
+            isochrones, pois = await IsochronesService().compute_frames(data)
+            content = await run_cpu(
+                to_bytes, concat_layers({"isochrones": isochrones, "pois": pois}), output_format)
+            return Response(content=content, media_type=FORMATS[output_format])
+        response = await IsochronesService().compute(data)
+        if config.DEBUG_VALIDATE_RESPONSES:
+            return response
+        return GeoJSONResponse(response)
     except Exception as e:
         logging.error(e, exc_info=True)
+        if output_format != "geojson":
+            # an empty GeoJSON body is not what the client can read
+            raise_binary_error(e)
         return IsochroneResponse(isochrones=FeatureCollection(type="FeatureCollection", features=[]), pois=None)
 
 
-@router.post("/pois", response_model=FeatureCollection, response_model_exclude_none=True)
+@router.post("/accessibility", response_model=AccessibilityResponse, response_model_exclude_none=True)
+async def compute_accessibility(
+    data: AccessibilityData,
+    api_key: str = Security(get_api_key),
+) -> AccessibilityResponse:
+    """Count the points of interest of each category reachable within each cutoff,
+    instead of returning them."""
+    try:
+        return await IsochronesService().compute_accessibility(data)
+    except Exception as e:
+        logging.error(e, exc_info=True)
+        return AccessibilityResponse(bands=[])
+
+
+@router.post("/compute-stream", response_class=StreamingResponse)
+async def compute_isochrones_stream(
+    data: IsochronePoisData,
+    accept: str | None = Header(None),
+    api_key: str = Security(get_api_key),
+) -> StreamingResponse:
+    """Compute isochrones and points of interest, streaming each isochrone band and then its POIs
+    as soon as they are ready. Results are sent as Server-Sent Events when requested by the
+    Accept header (text/event-stream), as newline-delimited JSON otherwise.
+    """
+    messages = IsochronesService().compute_stream(data)
+    if accept and "text/event-stream" in accept:
+        async def events() -> AsyncIterator[bytes]:
+            async for message in messages:
+                yield b"event: " + message["type"].encode() + b"\ndata: " + dumps(message) + b"\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def lines() -> AsyncIterator[bytes]:
+        async for message in messages:
+            yield dumps(message) + b"\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.post("/compute-batch", response_class=StreamingResponse)
+async def compute_isochrones_batch(
+    data: IsochroneBatchData,
+    api_key: str = Security(get_api_key),
+) -> StreamingResponse:
+    """Compute isochrones and points of interest for many origins.
+    Results are streamed as newline-delimited JSON: a line per origin with its isochrones, in
+    completion order, then a line per origin with its POIs if categories were requested.
+    """
+    return StreamingResponse(
+        IsochronesService().compute_batch(data),
+        media_type="application/x-ndjson")
+
+
+@router.get("/_cache", response_model=Dict, response_model_exclude_none=True)
+async def get_isochrones_cache_stats(
+    api_key: str = Security(get_api_key),
+) -> Dict:
+    """Get the isochrones cache hit/miss counters."""
+    try:
+        return await IsochronesService().get_cache_stats()
+    except Exception as e:
+        logging.error(e, exc_info=True)
+        return {'error': str(e)}
+
+
+@router.post("/pois", response_model=FeatureCollection, response_model_exclude_none=True, responses=BINARY_RESPONSES)
 async def get_pois(
     data: PoisData,
+    format: str | None = Query(
+        None, description=f"Output format, one of {', '.join(FORMATS)}"),
+    accept: str | None = Header(None),
     api_key: str = Security(get_api_key),
 ) -> FeatureCollection:
     """Get available OSM features for isochrone calculations."""
+    output_format = negotiate_format(format, accept)
+    if output_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE, detail=f"Unsupported format: {format}")
     try:
         pois_service = PoisService()
+        if output_format != "geojson":
+            features = await pois_service.get_features(
+                bbox=data.bbox,
+                categories=data.categories,
+                source=data.source,
+                cached=data.cached
+            )
+            tolerance = get_tolerance(data.simplify, data.zoom)
+            if tolerance is not None or data.precision is not None:
+                features = await run_cpu(simplify_geometries, features, tolerance, data.precision)
+            content = await run_cpu(to_bytes, features, output_format)
+            return Response(content=content, media_type=FORMATS[output_format])
         features = await pois_service.get_pois(
             bbox=data.bbox,
             categories=data.categories,
             source=data.source,
-            cached=data.cached
+            cached=data.cached,
+            tolerance=get_tolerance(data.simplify, data.zoom),
+            precision=data.precision
         )
-        return features
+        if config.DEBUG_VALIDATE_RESPONSES:
+            return features
+        return GeoJSONResponse(features)
     except Exception as e:
         logging.error(e, exc_info=True)
+        if output_format != "geojson":
+            raise_binary_error(e)
         return FeatureCollection(type="FeatureCollection", features=[], bbox=data.bbox)
 
 
+@router.get("/pois/_cache", response_model=Dict, response_model_exclude_none=True)
+async def get_pois_cache_stats(
+    api_key: str = Security(get_api_key),
+) -> Dict:
+    """Get the statistics of the decoded POI tiles cache of this worker."""
+    return get_frame_cache_stats()
+
+
 @router.post("/pois/_cache", response_model=Dict, response_model_exclude_none=True)
-async def get_pois(
+async def make_pois_cache(
+    job_id: str | None = Query(
+        default=None, description="Resume an interrupted cache build job."),
+    source: str | None = Query(
+        default=None, description="Source of POI data (e.g., 'osm.pbf')."),
     api_key: str = Security(get_api_key),
 ) -> Dict:
-    """Get available OSM features for isochrone calculations and cache them.
+    """Get available OSM features for isochrone calculations and cache them, in the background.
     Use default bounding box and categories from config.
+    Returns the job progress, see GET /pois/_cache/{job_id}.
     """
     try:
         pois_service = PoisService()
-        count_by_category = await pois_service.make_cache()
-        return count_by_category
+        return await pois_service.start_cache_job(job_id, source)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
     except Exception as e:
         logging.error(e, exc_info=True)
         return {'error': str(e)}
 
 
+@router.get("/pois/_cache/{job_id}", response_model=Dict, response_model_exclude_none=True)
+async def get_pois_cache_job(
+    job_id: str,
+    api_key: str = Security(get_api_key),
+) -> Dict:
+    """Get the progress of a cache build job: the number of (area, category) pairs
+    built and failed, and the number of features by category."""
+    pois_service = PoisService()
+    job = await pois_service.get_cache_job(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown cache job: {job_id}")
+    return job
+
+
 @router.delete("/pois/_cache", response_model=None)
 async def delete_pois_cache(
+    category: List[str] | None = Query(
+        default=None, description="Categories to delete. Defaults to all."),
+    bbox: List[float] | None = Query(
+        default=None, min_length=4, max_length=4,
+        description="Bounding box [min_lon, min_lat, max_lon, max_lat] to delete. Defaults to everywhere."),
     api_key: str = Security(get_api_key),
 ) -> None:
-    """Delete all cached OSM features."""
+    """Delete cached OSM features, of all or some categories, everywhere or in a bounding box."""
     try:
         pois_service = PoisService()
-        await pois_service.delete_cache()
+        await pois_service.delete_cache(category, bbox)
     except Exception as e:
         logging.error(e, exc_info=True)
         return None
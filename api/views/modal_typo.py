@@ -1,13 +1,24 @@
 import logging
-from typing import Dict
-from fastapi import APIRouter, Security
+from typing import Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Security, status
+from fastapi.responses import StreamingResponse
 from ..auth import get_api_key
-from typo_modal.service import TypoModalService, load_data
+from ..executor import run_cpu, run_io
+from ..service.modal_typo import compute, get_load_error, is_ready
+from ..service.modal_typo_bulk import BULK_FORMATS, SurveyScorer, negotiate_bulk_format, read_survey
 from ..models.modal_typo import ODData, RecoMultiData2, RecoProData2, TypoData, RecoData, RecoProData, EmplData
 
-router = APIRouter()
 
-od_mm, orig_dess, dest_dess, can_df = load_data()
+async def check_ready() -> None:
+    """The typology endpoints are unavailable until the datasets are loaded."""
+    if not is_ready():
+        error = get_load_error()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Typology datasets could not be loaded, retrying: {error}" if error else "Typology datasets are loading")
+
+
+router = APIRouter(dependencies=[Depends(check_ready)])
 
 
 @router.post("/geo", response_model=Dict)
@@ -16,23 +27,46 @@ async def compute_geo(
     api_key: str = Security(get_api_key),
 ) -> Dict:
     """Compute nearest origin and destination based on the provided data."""
-    service = TypoModalService(od_mm, orig_dess, dest_dess, can_df)
     try:
-        return service.compute_geo(odData.o_lon, odData.o_lat, odData.d_lon, odData.d_lat)
+        return await run_cpu(compute, 'compute_geo', odData.o_lon, odData.o_lat, odData.d_lon, odData.d_lat)
     except Exception as e:
         logging.error(e, exc_info=True)
         return {'error': str(e)}
 
 
+@router.post("/bulk")
+async def compute_bulk(
+    request: Request,
+    format: Optional[str] = Query(
+        None, description="Survey file format: csv, parquet or ndjson. Defaults to the Content-Type header."),
+    api_key: str = Security(get_api_key),
+) -> StreamingResponse:
+    """Compute the modal typology of each row of a survey file, and the multimodal recommendation
+    when the trip columns are provided (see /reco-multi), or the pro recommendations when the
+    pro score columns are provided (see /reco-pro-h3). The rows are streamed back in the same format,
+    with the result columns appended."""
+    survey_format = negotiate_bulk_format(format, request.headers.get("content-type"))
+    if survey_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Unsupported survey file format, expected one of: {', '.join(BULK_FORMATS)}")
+    try:
+        survey = await run_io(read_survey, await request.body(), survey_format)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unreadable survey file: {e}")
+    scorer = SurveyScorer(survey, survey_format)
+    return StreamingResponse(scorer.score(), media_type=BULK_FORMATS[survey_format])
+
+
 @router.post("/typo", response_model=Dict)
 async def compute_typo(
     data: TypoData,
     api_key: str = Security(get_api_key),
 ) -> Dict:
     """Compute modal typology based on the provided data."""
-    service = TypoModalService(od_mm, orig_dess, dest_dess, can_df)
     try:
-        typo = service.compute_typo(
+        typo = await run_cpu(
+            compute, 'compute_typo',
             data.a_voit,
             data.a_moto,
             data.a_tpu,
@@ -58,32 +92,31 @@ async def compute_reco(
     api_key: str = Security(get_api_key),
 ) -> Dict:
     """Compute modal recommendation based on the provided data."""
-    service = TypoModalService(od_mm, orig_dess, dest_dess, can_df)
     try:
-        t_traj_mm = service.compute_geo(
-            data.o_lon, data.o_lat, data.d_lon, data.d_lat)
-        reco_dt, scores = service.compute_reco_dt(t_traj_mm,
-                                                  data.tps_traj,
-                                                  data.tx_trav,
-                                                  data.tx_tele,
-                                                  data.fm_dt_voit,
-                                                  data.fm_dt_moto,
-                                                  data.fm_dt_tpu,
-                                                  data.fm_dt_train,
-                                                  data.fm_dt_velo,
-                                                  data.a_voit,
-                                                  data.a_moto,
-                                                  data.a_tpu,
-                                                  data.a_train,
-                                                  data.a_marc,
-                                                  data.a_velo,
-                                                  data.i_tmps,
-                                                  data.i_prix,
-                                                  data.i_flex,
-                                                  data.i_conf,
-                                                  data.i_fiab,
-                                                  data.i_prof,
-                                                  data.i_envi)
+        t_traj_mm = await run_cpu(compute, 'compute_geo',
+                                  data.o_lon, data.o_lat, data.d_lon, data.d_lat)
+        reco_dt, scores = await run_cpu(compute, 'compute_reco_dt', t_traj_mm,
+                                        data.tps_traj,
+                                        data.tx_trav,
+                                        data.tx_tele,
+                                        data.fm_dt_voit,
+                                        data.fm_dt_moto,
+                                        data.fm_dt_tpu,
+                                        data.fm_dt_train,
+                                        data.fm_dt_velo,
+                                        data.a_voit,
+                                        data.a_moto,
+                                        data.a_tpu,
+                                        data.a_train,
+                                        data.a_marc,
+                                        data.a_velo,
+                                        data.i_tmps,
+                                        data.i_prix,
+                                        data.i_flex,
+                                        data.i_conf,
+                                        data.i_fiab,
+                                        data.i_prof,
+                                        data.i_envi)
         return {'reco_dt': reco_dt, 'scores': scores}
     except Exception as e:
         logging.error(e, exc_info=True)
@@ -96,29 +129,28 @@ async def compute_reco_multi(
     api_key: str = Security(get_api_key),
 ) -> Dict:
     """Compute modal recommendation based on the provided data."""
-    service = TypoModalService(od_mm, orig_dess, dest_dess, can_df)
     try:
-        t_traj_mm = service.compute_geo(
-            data.o_lon, data.o_lat, data.d_lon, data.d_lat)
-        reco_dt2, scores, access = service.compute_reco_multi(t_traj_mm,
-                                                              data.tps_traj,
-                                                              data.constraints,
-                                                              [journey.model_dump(
-                                                              ) for journey in data.freq_mod_journeys],
-                                                              data.a_voit,
-                                                              data.a_moto,
-                                                              data.a_tpu,
-                                                              data.a_train,
-                                                              data.a_velo,
-                                                              data.a_marc,
-                                                              data.i_tmps,
-                                                              data.i_prix,
-                                                              data.i_flex,
-                                                              data.i_conf,
-                                                              data.i_fiab,
-                                                              data.i_prof,
-                                                              data.i_envi
-                                                              )
+        t_traj_mm = await run_cpu(compute, 'compute_geo',
+                                  data.o_lon, data.o_lat, data.d_lon, data.d_lat)
+        reco_dt2, scores, access = await run_cpu(compute, 'compute_reco_multi', t_traj_mm,
+                                                 data.tps_traj,
+                                                 data.constraints,
+                                                 [journey.model_dump(
+                                                 ) for journey in data.freq_mod_journeys],
+                                                 data.a_voit,
+                                                 data.a_moto,
+                                                 data.a_tpu,
+                                                 data.a_train,
+                                                 data.a_velo,
+                                                 data.a_marc,
+                                                 data.i_tmps,
+                                                 data.i_prix,
+                                                 data.i_flex,
+                                                 data.i_conf,
+                                                 data.i_fiab,
+                                                 data.i_prof,
+                                                 data.i_envi
+                                                 )
         return {'reco_dt2': reco_dt2, 'scores': scores, 'access': access}
     except Exception as e:
         logging.error(e, exc_info=True)
@@ -131,9 +163,8 @@ async def compute_reco_pro(
     api_key: str = Security(get_api_key),
 ) -> Dict:
     """Compute pro modal recommendation based on the provided data."""
-    service = TypoModalService(od_mm, orig_dess, dest_dess, can_df)
     try:
-        reco_pro_loc, reco_pro_reg, reco_pro_int = service.compute_reco_pro({
+        reco_pro_loc, reco_pro_reg, reco_pro_int = await run_cpu(compute, 'compute_reco_pro', {
             'velo': data.score_velo,
             'tpu': data.score_tpu,
             'train': data.score_train,
@@ -167,9 +198,8 @@ async def compute_reco_pro(
     api_key: str = Security(get_api_key),
 ) -> Dict:
     """Compute pro modal recommendation based on the provided data."""
-    service = TypoModalService(od_mm, orig_dess, dest_dess, can_df)
     try:
-        reco_pros = service.compute_reco_pro_h3({
+        reco_pros = await run_cpu(compute, 'compute_reco_pro_h3', {
             'velo': data.score_velo,
             'tpu': data.score_tpu,
             'train': data.score_train,
@@ -191,12 +221,11 @@ async def compute_empl_actions(
     api_key: str = Security(get_api_key),
 ) -> Dict:
     """Compute employer actions based on the provided data."""
-    service = TypoModalService(od_mm, orig_dess, dest_dess, can_df)
     try:
-        mesure_dt1, mesure_dt2, mesure_pro = service.compute_mesu_empl(
-            data.empl.model_dump(),
-            data.reco_dt2,
-            data.reco_pro)
+        mesure_dt1, mesure_dt2, mesure_pro = await run_cpu(compute, 'compute_mesu_empl',
+                                                           data.empl.model_dump(),
+                                                           data.reco_dt2,
+                                                           data.reco_pro)
         return {'mesure_dt1': mesure_dt1, 'mesure_dt2': mesure_dt2, 'mesure_pro': mesure_pro}
     except Exception as e:
         logging.error(e, exc_info=True)
@@ -0,0 +1,36 @@
+# Production server configuration, see start-prod.sh
+# Settings can be overridden with environment variables.
+import multiprocessing
+import os
+from api.config import config
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+# Each worker runs its CPU-bound work in its own process pool (a thread if its size is 0),
+# by default there are as many processes of the pools as cores
+cores = multiprocessing.cpu_count()
+cpu_workers = max(config.EXECUTOR_CPU_WORKERS, 1)
+workers = int(os.environ.get("WEB_CONCURRENCY", max(cores // cpu_workers, 1)))
+
+# Load the application, and its shared data, once before forking the workers
+preload_app = True
+
+# Keep the client connections open between requests (seconds)
+keepalive = int(os.environ.get("KEEP_ALIVE", "5"))
+
+# Recycle the workers gracefully after a number of requests, staggered by the jitter
+max_requests = int(os.environ.get("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.environ.get("MAX_REQUESTS_JITTER", "1000"))
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.environ.get("TIMEOUT", "120"))
+
+accesslog = "-"
+
+
+def when_ready(server):
+    if workers * cpu_workers > cores:
+        server.log.warning(f"{workers} workers with {cpu_workers} CPU executor workers each "
+                           f"oversubscribe the {cores} cores.")
+    # the application is loaded, the workers are not forked yet
+    from api.main import preload
+    preload()
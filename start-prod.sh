@@ -0,0 +1,2 @@
+# Production server: several worker processes, see gunicorn.conf.py
+gunicorn --config gunicorn.conf.py api.main:app
@@ -0,0 +1,58 @@
+import os
+
+os.environ.setdefault("API_KEYS", "test")
+
+import fakeredis  # noqa: E402
+import pytest  # noqa: E402
+
+# Modules holding a reference to the Redis client
+REDIS_MODULES = ["api.cache", "api.singleflight", "api.service.pois", "api.service.isochrones"]
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    """In-memory Redis, shared by all the modules using the Redis client."""
+    fake = fakeredis.aioredis.FakeRedis()
+    for module in REDIS_MODULES:
+        try:
+            monkeypatch.setattr(f"{module}.redis", fake)
+        except ImportError:
+            # module depending on a package that is not installed
+            pass
+    return fake
+
+
+class FakeOtp:
+    """Fake OTP isochrones: a disc per cutoff around the origin, of 0.01 degree per 10 minutes."""
+
+    def __init__(self):
+        # the arguments of each call
+        self.calls = []
+        # awaited with the call arguments before computing, e.g. to raise an error or wait
+        self.before = None
+
+    async def calculate_isochrones(self, **kwargs):
+        from geopandas import GeoDataFrame
+        from shapely.geometry import Point
+        self.calls.append(kwargs)
+        if self.before is not None:
+            await self.before(kwargs)
+        cutoffs = sorted(kwargs["cutoffSec"], reverse=True)
+        return GeoDataFrame({"time": cutoffs},
+                            geometry=[Point(kwargs["lon"], kwargs["lat"]).buffer(cutoff / 60000) for cutoff in cutoffs],
+                            crs="EPSG:4326")
+
+
+@pytest.fixture
+def otp(monkeypatch):
+    """Fake OTP isochrones, see FakeOtp."""
+    pytest.importorskip("isochrones")
+    from api.service import isochrones as isochrones_service
+    fake = FakeOtp()
+    monkeypatch.setattr(isochrones_service.otp, "calculate_isochrones", fake.calculate_isochrones)
+    return fake
@@ -0,0 +1,38 @@
+from geopandas import GeoDataFrame
+from shapely.geometry import Point
+from api.service.accessibility import count_pois, get_band_cutoffs
+
+CATEGORY_TAGS = {"health": {"amenity": ["pharmacy"]}, "food": {"amenity": ["cafe"]}}
+
+
+def make_isochrones(times: list[int | None], radii: list[float]) -> GeoDataFrame:
+    return GeoDataFrame({"time": times}, geometry=[Point(0, 0).buffer(radius) for radius in radii],
+                        crs="EPSG:4326")
+
+
+def make_pois() -> GeoDataFrame:
+    return GeoDataFrame({"amenity": ["pharmacy", "cafe", "cafe"]},
+                        geometry=[Point(0.5, 0), Point(1.5, 0), Point(5, 0)], crs="EPSG:4326")
+
+
+def test_band_cutoffs_from_time_column():
+    # areas do not follow the cutoffs, e.g. a faster mode reaching further
+    isochrones = make_isochrones([600, 300, 900], [1, 2, 3])
+    assert get_band_cutoffs(isochrones, [300, 600]) == [600, 300, None]
+    assert get_band_cutoffs(isochrones.drop(columns="time"), [900, 300, 600]) == [300, 600, 900]
+    assert get_band_cutoffs(isochrones.drop(columns="time"), [300, 600]) == [None, None, None]
+
+
+def test_count_pois_matches_cutoffs_by_time():
+    isochrones = make_isochrones([600, 300], [2, 1])
+    counts, nearest = count_pois(isochrones, make_pois(), [300, 600], CATEGORY_TAGS)
+    assert counts == {300: {"health": 1, "food": 0}, 600: {"health": 1, "food": 1}}
+    assert nearest == {"health": 300, "food": 600}
+
+
+def test_count_pois_ignores_isochrones_of_other_cutoffs():
+    # an isochrone missing for a cutoff does not shift the others
+    isochrones = make_isochrones([600], [2])
+    counts, nearest = count_pois(isochrones, make_pois(), [300, 600], CATEGORY_TAGS)
+    assert counts == {300: {"health": 0, "food": 0}, 600: {"health": 1, "food": 1}}
+    assert nearest == {"health": 600, "food": 600}
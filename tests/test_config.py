@@ -1,5 +1,18 @@
+import multiprocessing
 import os
+import runpy
+import pytest
+from api.config import config
 
 
 def test_config():
     pass
+
+
+@pytest.mark.parametrize("cpu_workers, workers", [(2, 4), (3, 2), (0, 8), (16, 1)])
+def test_gunicorn_workers_within_cores(monkeypatch, cpu_workers, workers):
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.setattr(multiprocessing, "cpu_count", lambda: 8)
+    monkeypatch.setattr(config, "EXECUTOR_CPU_WORKERS", cpu_workers)
+    settings = runpy.run_path(os.path.join(os.path.dirname(__file__), "..", "gunicorn.conf.py"))
+    assert settings["workers"] == workers
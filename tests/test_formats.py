@@ -0,0 +1,66 @@
+import io
+import geopandas
+import pandas as pd
+import pyarrow as pa
+import pytest
+from fastapi import HTTPException
+from geopandas import GeoDataFrame
+from shapely.geometry import Point
+from api.service.formats import concat_layers, negotiate_format, to_bytes
+
+
+def make_features() -> GeoDataFrame:
+    index = pd.MultiIndex.from_tuples([("node", 1), ("way", 2)], names=["element", "id"])
+    return GeoDataFrame({"name": ["a", None], "opening_hours": [["Mo-Fr"], "24/7"]},
+                        geometry=[Point(6.5, 46.5), Point(6.6, 46.6)], crs="EPSG:4326", index=index)
+
+
+def read_bytes(content: bytes, format: str) -> GeoDataFrame:
+    if format == "arrow":
+        return GeoDataFrame.from_arrow(pa.ipc.open_file(content).read_all())
+    if format == "parquet":
+        return geopandas.read_parquet(io.BytesIO(content))
+    return geopandas.read_file(io.BytesIO(content), engine="pyogrio")
+
+
+def test_negotiate_format():
+    assert negotiate_format() == "geojson"
+    assert negotiate_format("parquet") == "parquet"
+    assert negotiate_format("shapefile") is None
+    assert negotiate_format(accept="application/flatgeobuf, */*") == "fgb"
+
+
+@pytest.mark.parametrize("format", ["arrow", "parquet", "fgb"])
+def test_to_bytes(format):
+    isochrones = GeoDataFrame({"time": [300]}, geometry=[Point(6.5, 46.5).buffer(0.1)], crs="EPSG:4326")
+    content = to_bytes(concat_layers({"pois": make_features(), "isochrones": isochrones}), format)
+    features = read_bytes(content, format)
+    assert sorted(features["layer"]) == ["isochrones", "pois", "pois"]
+    # the OSM ids are kept (FlatGeobuf orders the features by its spatial index)
+    pois = features[features["layer"] == "pois"]
+    assert sorted(zip(pois["element"], pois["id"])) == [("node", 1), ("way", 2)]
+
+
+@pytest.mark.parametrize("format", ["arrow", "parquet", "fgb"])
+def test_to_bytes_keeps_the_ids(format):
+    features = read_bytes(to_bytes(make_features(), format), format)
+    assert sorted(zip(features["element"], features["id"])) == [("node", 1), ("way", 2)]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("format", ["parquet", "fgb"])
+async def test_binary_format_errors(redis, otp, format):
+    from api.models.isochrones import IsochronePoisData
+    from api.service.otp import OtpError
+    from api.views.isochrones import compute_isochrones
+
+    async def unavailable(kwargs):
+        raise OtpError("OTP call failed")
+    otp.before = unavailable
+    data = IsochronePoisData(lon=6.6, lat=46.5, cutoffSec=[600], datetime="2025-03-10T08:00:00")
+    with pytest.raises(HTTPException) as error:
+        await compute_isochrones(data, format=format, accept=None, api_key="test")
+    assert error.value.status_code == 503
+    # GeoJSON keeps its empty collection
+    response = await compute_isochrones(data, format=None, accept=None, api_key="test")
+    assert response.isochrones.features == []
@@ -0,0 +1,42 @@
+import time
+from geopandas import GeoDataFrame
+from shapely.geometry import Point
+from api.service.frame_cache import FrameCache, get_frame_size
+
+
+def make_frame(n: int = 10) -> GeoDataFrame:
+    return GeoDataFrame({"name": [f"poi {i}" for i in range(n)]},
+                        geometry=[Point(6.5 + i / 1000, 46.5) for i in range(n)], crs="EPSG:4326")
+
+
+def test_max_age_since_written():
+    cache = FrameCache(10 ** 6)
+    frame = make_frame()
+    cache.put("pois:health:0:12:1:1", frame, time.time() - 100, cache.generation)
+    assert cache.get("pois:health:0:12:1:1", max_age=200) is frame
+    assert cache.get("pois:health:0:12:1:1", max_age=50) is None
+    assert len(cache) == 0
+
+
+def test_frames_read_before_an_invalidation_are_not_cached():
+    cache = FrameCache(10 ** 6)
+    generation = cache.generation
+    cache.invalidate("pois:health:0:12:1:1")
+    cache.put("pois:health:0:12:1:1", make_frame(), time.time(), generation)
+    assert cache.get("pois:health:0:12:1:1") is None
+
+    generation = cache.generation
+    cache.invalidate_prefix("pois:food:")
+    cache.put("pois:health:0:12:1:1", make_frame(), time.time(), generation)
+    assert len(cache) == 0
+    cache.put("pois:health:0:12:1:1", make_frame(), time.time(), cache.generation)
+    assert len(cache) == 1
+
+
+def test_eviction_within_memory_size():
+    frame = make_frame()
+    cache = FrameCache(get_frame_size(frame) * 2)
+    for key in ["a", "b", "c"]:
+        cache.put(key, make_frame(), time.time(), cache.generation)
+    assert cache.get("a") is None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1 and cache.size <= cache.max_bytes
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from geopandas import GeoDataFrame
+from pydantic import ValidationError
+from shapely.geometry import Point, Polygon
+from api.models.isochrones import PoisData
+from api.service.geometry import get_tolerance, simplify_geometries
+
+
+def make_bands() -> GeoDataFrame:
+    """Two adjacent polygons sharing a jagged boundary."""
+    ys = np.linspace(0, 1, 50)
+    xs = 0.5 + 0.001 * np.sin(ys * 200)
+    boundary = list(zip(xs, ys))
+    left = Polygon([(0, 0), *boundary, (0, 1)])
+    right = Polygon([(1, 0), (1, 1), *boundary[::-1]])
+    return GeoDataFrame({"time": [300, 600]}, geometry=[left, right], crs="EPSG:4326")
+
+
+def test_tolerance():
+    assert get_tolerance(0.001, 12) == 0.001
+    assert get_tolerance(None, 8) == pytest.approx(360 / (256 * 2 ** 8))
+    assert get_tolerance() is None
+
+
+def test_coverage_simplification_keeps_bands_adjacent():
+    bands = make_bands()
+    simplified = simplify_geometries(bands, 0.01, coverage=True)
+    left, right = simplified.geometry
+    assert len(left.exterior.coords) < len(bands.geometry[0].exterior.coords)
+    assert left.intersection(right).area == pytest.approx(0, abs=1e-12)
+    assert left.union(right).area == pytest.approx(1)
+
+
+def test_coverage_simplification_of_nested_bands():
+    inner = Point(0, 0).buffer(1, quad_segs=64)
+    outer = Point(0.2, 0).buffer(2, quad_segs=64).difference(inner)
+    bands = GeoDataFrame({"time": [300, 600]}, geometry=[inner, outer], crs="EPSG:4326")
+    simplified_inner, simplified_outer = simplify_geometries(bands, 0.05, coverage=True).geometry
+    assert simplified_inner.intersection(simplified_outer).area == pytest.approx(0, abs=1e-12)
+    # no gap between the inner band and the hole of the outer band
+    assert simplified_inner.union(simplified_outer).area == pytest.approx(Polygon(simplified_outer.exterior).area)
+
+
+@pytest.mark.parametrize("options", [{"simplify": 1.0}, {"simplify": -0.1}, {"zoom": 0}, {"zoom": 30},
+                                     {"precision": 0}, {"precision": 16}])
+def test_geometry_options_bounds(options):
+    with pytest.raises(ValidationError):
+        PoisData(bbox=[6.5, 46.5, 6.6, 46.6], **options)
+    PoisData(bbox=[6.5, 46.5, 6.6, 46.6], simplify=0.0001, zoom=14, precision=6)
@@ -0,0 +1,146 @@
+import pytest
+from geopandas import GeoDataFrame
+from shapely.geometry import Point
+
+pytest.importorskip("isochrones")
+
+from api.models.isochrones import IsochroneData  # noqa: E402
+from api.service import isochrones as isochrones_service  # noqa: E402
+from api.service.isochrones import IsochronesService  # noqa: E402
+
+
+def make_data(**kwargs) -> IsochroneData:
+    return IsochroneData(**{"lon": 6.5668, "lat": 46.5191, "cutoffSec": [600, 300],
+                            "datetime": "2025-03-10T08:07:00", "mode": "WALK", **kwargs})
+
+
+def test_cache_key_shared_within_cell_and_slot():
+    service = IsochronesService()
+    key = service._make_cache_key(make_data())
+    assert service._make_cache_key(make_data(lon=6.56681, lat=46.51912)) == key
+    assert service._make_cache_key(make_data(datetime="2025-03-10T08:14:59")) == key
+    assert service._make_cache_key(make_data(cutoffSec=[300, 600])) == key
+
+
+def test_cache_key_differs_between_cells_slots_and_modes():
+    service = IsochronesService()
+    key = service._make_cache_key(make_data())
+    assert service._make_cache_key(make_data(lon=6.5690)) != key
+    assert service._make_cache_key(make_data(datetime="2025-03-10T08:15:00")) != key
+    assert service._make_cache_key(make_data(datetime="2025-03-17T08:07:00")) != key
+    assert service._make_cache_key(make_data(mode="BICYCLE")) != key
+
+
+@pytest.mark.anyio
+async def test_isochrones_computed_from_cell_origin(redis, otp):
+    service = IsochronesService()
+    first = await service.get_isochrones(make_data())
+    second = await service.get_isochrones(make_data(lon=6.56681, lat=46.51912, datetime="2025-03-10T08:14:00"))
+
+    assert len(otp.calls) == 1
+    lon, lat, date_time = service._get_cache_origin(make_data())
+    call = otp.calls[0]
+    assert (call["lon"], call["lat"], call["date_time"]) == (lon, lat, date_time)
+    assert date_time.minute == 0 and date_time.second == 0
+    assert first.geometry.geom_equals_exact(second.geometry, 1e-9).all()
+
+
+async def read_batch(service: IsochronesService, data) -> tuple[dict[int, dict], dict[int, dict]]:
+    """The isochrones (or error) line and the POIs line of each origin."""
+    import orjson
+    lines = [orjson.loads(chunk) async for chunk in service.compute_batch(data)]
+    isochrones = {line["index"]: line for line in lines if "pois" not in line}
+    pois = {line["index"]: line for line in lines if "pois" in line}
+    # the POIs lines come after all the isochrones lines
+    assert all("pois" in line for line in lines[len(isochrones):])
+    return isochrones, pois
+
+
+@pytest.mark.anyio
+async def test_batch_streams_error_rows(redis, otp, monkeypatch):
+    from api.models.isochrones import IsochroneBatchData
+
+    async def no_route_east(kwargs):
+        if kwargs["lon"] > 7:
+            raise ValueError("No route")
+    otp.before = no_route_east
+
+    async def fetch_features(self, bbox, categories, source):
+        raise ConnectionError("Overpass is down")
+    monkeypatch.setattr(isochrones_service.PoisService, "_fetch_features", fetch_features)
+    data = IsochroneBatchData(origins=[make_data(), make_data(lon=7.5), make_data(lat=46.6)],
+                              categories=["health"])
+    lines, pois_lines = await read_batch(IsochronesService(), data)
+
+    assert sorted(lines) == [0, 1, 2]
+    assert lines[1]["error"] == "No route" and "isochrones" not in lines[1]
+    # the POIs failed, the isochrones are still returned
+    for index in [0, 2]:
+        assert lines[index]["isochrones"]["features"]
+    assert sorted(pois_lines) == [0, 2]
+    assert all(line["pois"] is None for line in pois_lines.values())
+
+
+@pytest.mark.anyio
+async def test_batch_pois_error_per_item(redis, otp, monkeypatch):
+    from api.models.isochrones import IsochroneBatchData
+
+    async def get_pois(self, **kwargs):
+        raise RuntimeError("Unexpected")
+    monkeypatch.setattr(isochrones_service.PoisService, "get_pois", get_pois)
+    data = IsochroneBatchData(origins=[make_data(), make_data(lat=46.6)], categories=["health"])
+    lines, pois_lines = await read_batch(IsochronesService(), data)
+
+    assert sorted(lines) == sorted(pois_lines) == [0, 1]
+    for index in [0, 1]:
+        assert lines[index]["isochrones"]["features"] and "error" not in lines[index]
+        assert pois_lines[index]["error"] == "POIs unavailable: Unexpected"
+
+
+@pytest.mark.anyio
+async def test_batch_emits_isochrones_as_they_complete(redis, otp, monkeypatch):
+    import asyncio
+    import orjson
+    from api.models.isochrones import IsochroneBatchData
+    slow_origin = asyncio.Event()
+
+    async def slow_east(kwargs):
+        if kwargs["lon"] > 7:
+            await slow_origin.wait()
+    otp.before = slow_east
+
+    async def fetch_features(self, bbox, categories, source):
+        return GeoDataFrame({"amenity": ["pharmacy"]}, geometry=[Point(6.5668, 46.5191)], crs="EPSG:4326")
+    monkeypatch.setattr(isochrones_service.PoisService, "_fetch_features", fetch_features)
+    data = IsochroneBatchData(origins=[make_data(), make_data(lon=7.5)], categories=["health"])
+    lines = IsochronesService().compute_batch(data)
+
+    # emitted while the other origin is still being computed
+    first = orjson.loads(await asyncio.wait_for(anext(lines), 1))
+    assert first["index"] == 0 and first["isochrones"]["features"]
+    slow_origin.set()
+    rest = [orjson.loads(line) async for line in lines]
+    assert [(line["index"], "pois" in line) for line in rest[:1]] == [(1, False)]
+    pois = {line["index"]: line["pois"] for line in rest[1:]}
+    assert len(pois[0]["features"]) == 1 and pois[1] is None
+
+
+@pytest.mark.anyio
+async def test_stream_single_otp_call_and_pois_fetch(redis, otp, monkeypatch):
+    from api.models.isochrones import IsochronePoisData
+    fetches = []
+
+    async def fetch_features(self, bbox, categories, source):
+        fetches.append(bbox)
+        # one POI 0.007 degrees east of the origin: within the 600 s band only
+        return GeoDataFrame({"amenity": ["pharmacy"]}, geometry=[Point(6.5668 + 0.007, 46.5191)], crs="EPSG:4326")
+    monkeypatch.setattr(isochrones_service.PoisService, "_fetch_features", fetch_features)
+    data = IsochronePoisData(**make_data(cutoffSec=[600, 300]).model_dump(), categories=["health"], overlap=False)
+    messages = [message async for message in IsochronesService().compute_stream(data)]
+
+    assert [call["cutoffSec"] for call in otp.calls] == [[300, 600]]
+    assert len(fetches) == 1
+    assert [(message["type"], message["cutoffSec"]) for message in messages] == [
+        ("isochrone", 300), ("pois", 300), ("isochrone", 600), ("pois", 600)]
+    assert messages[1]["pois"] is None
+    assert len(messages[3]["pois"]["features"]) == 1
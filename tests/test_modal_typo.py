@@ -0,0 +1,67 @@
+import pytest
+from fastapi import HTTPException
+
+pytest.importorskip("typo_modal")
+
+from api.config import config  # noqa: E402
+from api.service import modal_typo  # noqa: E402
+
+
+@pytest.fixture
+def unloaded(monkeypatch):
+    """Typology datasets not loaded yet, without snapshot."""
+    for name, value in {"datasets": None, "ready": False, "load_error": None, "service": None}.items():
+        monkeypatch.setattr(modal_typo, name, value)
+    monkeypatch.setattr(modal_typo, "has_snapshot", lambda: False)
+    modal_typo._compute_memoized.cache_clear()
+
+
+@pytest.mark.anyio
+async def test_load_retried_until_loaded(unloaded, monkeypatch):
+    pytest.importorskip("isochrones")
+    from api.main import load_datasets
+    from api.views.modal_typo import check_ready
+    load_data = modal_typo.load_data
+    attempts = []
+
+    def failing_load_data():
+        attempts.append(modal_typo.get_load_error())
+        if len(attempts) < 3:
+            raise OSError("Dataset unavailable")
+        return load_data()
+    monkeypatch.setattr(modal_typo, "load_data", failing_load_data)
+    monkeypatch.setattr(config, "TYPO_LOAD_RETRY", 0.01)
+    await load_datasets()
+
+    assert attempts == [None, "Dataset unavailable", "Dataset unavailable"]
+    assert modal_typo.is_ready() and modal_typo.get_load_error() is None
+    await check_ready()
+
+
+@pytest.mark.anyio
+async def test_load_error_reported(unloaded, monkeypatch):
+    pytest.importorskip("isochrones")
+    from api.views.modal_typo import check_ready
+
+    def failing_load_data():
+        raise OSError("Dataset unavailable")
+    monkeypatch.setattr(modal_typo, "load_data", failing_load_data)
+    with pytest.raises(OSError):
+        modal_typo.get_service()
+    with pytest.raises(HTTPException) as error:
+        await check_ready()
+    assert error.value.status_code == 503
+    assert "Dataset unavailable" in error.value.detail
+
+
+def _acquire_lock() -> bool:
+    return modal_typo._lock.acquire(timeout=1)
+
+
+def test_lock_reset_in_forked_processes():
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    # the datasets being loaded while the CPU executor forks its processes
+    with modal_typo._lock:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork")) as pool:
+            assert pool.submit(_acquire_lock).result(timeout=5)
@@ -0,0 +1,78 @@
+import io
+import json
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pytest
+
+pytest.importorskip("typo_modal")
+
+from api import executor  # noqa: E402
+from api.service import modal_typo  # noqa: E402
+from api.service.modal_typo_bulk import SurveyScorer  # noqa: E402
+
+TYPO_ROW = {"a_voit": 1, "a_moto": 0, "a_tpu": 1, "a_train": 0, "a_marc": 1, "a_velo": 0,
+            "i_tmps": 3, "i_prix": 2, "i_flex": 1, "i_conf": 2, "i_fiab": 3, "i_prof": 1, "i_envi": 2}
+RECO_PRO_ROW = {"score_velo": 2, "score_tpu": 3, "score_train": 1, "score_elec": 0, "d_lon": 6.6, "d_lat": 46.5,
+                "freq_mod_pro_journeys": json.dumps([{"mode": "train", "days": 2, "hex_id": "881f1d4887fffff"}])}
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """The typology computations, counted by method. They run in a thread to see the patches."""
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(executor.cpu_executor, "_executor", pool)
+    calls = []
+    compute = modal_typo.compute
+
+    def counted_compute(method, *args):
+        calls.append(method)
+        return compute(method, *args)
+    monkeypatch.setattr(modal_typo, "compute", counted_compute)
+    modal_typo._compute_memoized.cache_clear()
+    yield calls
+    pool.shutdown()
+
+
+async def score(survey: pd.DataFrame, format: str = "csv") -> pd.DataFrame:
+    scorer = SurveyScorer(survey, format)
+    # validated in the process pool
+    pickle.dumps(scorer._validate)
+    content = b"".join([chunk async for chunk in scorer.score()])
+    return pd.read_csv(io.BytesIO(content))
+
+
+@pytest.mark.anyio
+async def test_bulk_typo_scores_identical_rows_once(calls):
+    rows = [TYPO_ROW, TYPO_ROW, {**TYPO_ROW, "a_voit": 2}]
+    scored = await score(pd.DataFrame(rows))
+    assert calls.count("compute_typo") == 2
+    assert list(scored["typo"]) == [modal_typo.compute("compute_typo", *[row[field] for field in modal_typo.TYPO_FIELDS])
+                                    for row in rows]
+    assert scored["error"].isna().all()
+
+
+@pytest.mark.anyio
+async def test_bulk_reco_pro(calls, monkeypatch):
+    arguments = []
+
+    def compute_reco_pro_h3(self, scores, journeys, d_lat, d_lon):
+        arguments.append((scores, journeys, d_lat, d_lon))
+        return ["train"]
+    monkeypatch.setattr(modal_typo.TypoModalService, "compute_reco_pro_h3", compute_reco_pro_h3)
+    scored = await score(pd.DataFrame([RECO_PRO_ROW]))
+    assert json.loads(scored["reco_pros"][0]) == ["train"]
+    assert scored["typo"].isna().all() and scored["error"].isna().all()
+    assert arguments == [({"velo": 2, "tpu": 3, "train": 1, "elec": 0},
+                          [{"mode": "train", "days": 2, "hex_id": "881f1d4887fffff"}], 46.5, 6.6)]
+
+
+@pytest.mark.anyio
+async def test_bulk_invalid_rows_are_reported(calls):
+    survey = pd.DataFrame([RECO_PRO_ROW, {**RECO_PRO_ROW, "freq_mod_pro_journeys": "[{"},
+                           {**RECO_PRO_ROW, "score_velo": "high"}])
+    scored = await score(survey)
+    assert scored["error"][0] != scored["error"][0]  # NaN, valid row
+    assert "Expecting" in scored["error"][1]
+    assert "score_velo" in scored["error"][2]
+    assert calls.count("compute_reco_pro_h3") == 1
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+import pytest
+from fastapi import HTTPException
+from geopandas import GeoDataFrame
+
+pytest.importorskip("isochrones")
+
+from api.config import config  # noqa: E402
+from api.service import otp as otp_service  # noqa: E402
+from api.service.otp import CircuitBreaker, OtpError, OtpGateway, OtpUnavailableError  # noqa: E402
+
+
+class Response:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.response = Response(status_code)
+
+
+def test_circuit_opens_after_consecutive_failures_and_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.on_failure()
+    assert breaker.state == "closed"
+    breaker.on_failure()
+    assert breaker.state == "open"
+    with pytest.raises(OtpUnavailableError):
+        breaker.before_call()
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    breaker.before_call()
+    with pytest.raises(OtpUnavailableError):
+        breaker.before_call()
+    breaker.on_success()
+    assert breaker.state == "closed"
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    monkeypatch.setattr(config, "OTP_CIRCUIT_FAILURES", 2)
+    monkeypatch.setattr(config, "OTP_MAX_CONNECTIONS", 1)
+    return OtpGateway()
+
+
+@pytest.mark.anyio
+async def test_error_responses_and_invalid_payloads_are_failures(gateway, monkeypatch):
+    def server_error(**kwargs):
+        raise HTTPError(502)
+    monkeypatch.setattr(otp_service, "calculate_isochrones", server_error)
+    with pytest.raises(OtpError):
+        await gateway.calculate_isochrones(lat=46.5, lon=6.6)
+    monkeypatch.setattr(otp_service, "calculate_isochrones", lambda **kwargs: {"error": "proxy"})
+    with pytest.raises(OtpError, match="Invalid OTP response"):
+        await gateway.calculate_isochrones(lat=46.5, lon=6.6)
+    assert gateway.breaker.state == "open"
+    with pytest.raises(OtpUnavailableError):
+        await gateway.calculate_isochrones(lat=46.5, lon=6.6)
+
+
+@pytest.mark.anyio
+async def test_client_errors_are_not_failures(gateway, monkeypatch):
+    def bad_request(**kwargs):
+        raise HTTPError(400)
+    monkeypatch.setattr(otp_service, "calculate_isochrones", bad_request)
+    for _ in range(3):
+        with pytest.raises(HTTPError):
+            await gateway.calculate_isochrones(lat=46.5, lon=6.6)
+    assert gateway.breaker.state == "closed"
+    monkeypatch.setattr(otp_service, "calculate_isochrones", lambda **kwargs: GeoDataFrame(geometry=[]))
+    assert (await gateway.calculate_isochrones(lat=46.5, lon=6.6)).empty
+
+
+@pytest.mark.anyio
+async def test_connection_slot_held_until_the_call_finishes(gateway, monkeypatch):
+    monkeypatch.setattr(config, "OTP_TIMEOUT", 0.05)
+    finished = threading.Event()
+
+    def slow(**kwargs):
+        time.sleep(0.3)
+        finished.set()
+        return GeoDataFrame(geometry=[])
+    monkeypatch.setattr(otp_service, "calculate_isochrones", slow)
+    with pytest.raises(OtpError, match="did not respond"):
+        await gateway.calculate_isochrones(lat=46.5, lon=6.6)
+    # the thread still holds its connection
+    assert gateway._connections.locked()
+    while not finished.is_set():
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.01)
+    assert not gateway._connections.locked()
+
+
+@pytest.mark.anyio
+async def test_hung_calls_do_not_hold_the_io_threads(gateway, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from api import executor
+    monkeypatch.setattr(config, "OTP_TIMEOUT", 0.05)
+    monkeypatch.setattr(executor.otp_executor, "_executor", ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(executor.io_executor, "_executor", ThreadPoolExecutor(max_workers=1))
+    timeouts = []
+    released = threading.Event()
+
+    def hung(timeout, **kwargs):
+        timeouts.append(timeout)
+        released.wait(5)
+        return GeoDataFrame(geometry=[])
+    monkeypatch.setattr(otp_service, "calculate_isochrones", hung)
+    with pytest.raises(OtpError, match="did not respond"):
+        await gateway.calculate_isochrones(lat=46.5, lon=6.6)
+    # the client is given the HTTP timeout, the other I/O work is not stuck behind the call
+    assert timeouts == [0.05]
+    started = time.monotonic()
+    assert await executor.run_io(lambda: "decoded") == "decoded"
+    assert time.monotonic() - started < 0.5
+    released.set()
+
+
+@pytest.mark.anyio
+async def test_modes_unavailable(monkeypatch):
+    from api.views.isochrones import get_modes
+
+    def server_error(otp_url, api_key=None):
+        raise HTTPError(503)
+    monkeypatch.setattr(otp_service, "get_available_modes", server_error)
+    monkeypatch.setattr(otp_service.otp, "_modes", None)
+    with pytest.raises(HTTPException) as error:
+        await get_modes(api_key="test")
+    assert error.value.status_code == 503
@@ -0,0 +1,50 @@
+import json
+import pandas as pd
+import pyarrow as pa
+from geopandas import GeoDataFrame
+from shapely.geometry import Point
+from api.service import poi_codec
+
+
+def make_features() -> GeoDataFrame:
+    index = pd.MultiIndex.from_tuples([("node", 1), ("way", 2), ("node", 3)], names=["element", "id"])
+    return GeoDataFrame({"name": ["a", None, "[1]"],
+                         "opening_hours": [["Mo-Fr", "Sa"], "24/7", None],
+                         "contact": [{"phone": "+41"}, None, "none"],
+                         "level": [0, 1, 2]},
+                        index=index, geometry=[Point(6.5, 46.5), Point(6.6, 46.6), Point(6.7, 46.7)],
+                        crs="EPSG:4326")
+
+
+def values(series: pd.Series) -> list:
+    return [None if poi_codec._is_missing(value) else value for value in series]
+
+
+def test_round_trip():
+    features = make_features()
+    decoded = poi_codec.decode(poi_codec.encode(features))
+    assert decoded.index.equals(features.index)
+    assert list(decoded.index.names) == ["element", "id"]
+    assert decoded.crs == features.crs
+    assert decoded.geometry.geom_equals(features.geometry).all()
+    assert values(decoded["name"]) == ["a", None, "[1]"]
+    assert values(decoded["opening_hours"]) == [["Mo-Fr", "Sa"], "24/7", None]
+    assert values(decoded["contact"]) == [{"phone": "+41"}, None, "none"]
+    assert values(decoded["level"]) == [0, 1, 2]
+
+
+def test_round_trip_of_unnamed_and_empty_indexes():
+    features = make_features().reset_index(drop=True)
+    assert poi_codec.decode(poi_codec.encode(features)).index.equals(features.index)
+    empty = GeoDataFrame(geometry=[], crs="EPSG:4326")
+    assert poi_codec.decode(poi_codec.encode(empty)).empty
+
+
+def test_decode_previous_versions():
+    features = make_features().reset_index(drop=True)[["name", "geometry"]]
+    table = pa.table(features.to_arrow(index=False))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    assert values(poi_codec.decode(poi_codec.LEGACY_MAGIC + sink.getvalue().to_pybytes())["name"]) == ["a", None, "[1]"]
+    assert values(poi_codec.decode(json.dumps(features.__geo_interface__))["name"]) == ["a", None, "[1]"]
@@ -0,0 +1,110 @@
+import os
+import numpy as np
+import pyarrow as pa
+import pytest
+from geopandas import GeoDataFrame, points_from_xy
+from api.service import poi_store
+from api.service.poi_store import PoiStore, ingest
+
+TAGS = {"amenity": ["pharmacy", "cafe"]}
+
+
+@pytest.fixture
+def extract(monkeypatch):
+    """Random points in a 0.2 degree square, read as the layers of an OSM PBF extract."""
+    rng = np.random.default_rng(0)
+    xs, ys = rng.uniform(6.5, 6.7, 2000), rng.uniform(46.5, 46.7, 2000)
+    points = GeoDataFrame({"osm_id": np.arange(len(xs)).astype(str), "name": None,
+                           "amenity": rng.choice(["pharmacy", "cafe", "bench"], len(xs)), "other_tags": None},
+                          geometry=points_from_xy(xs, ys), crs="EPSG:4326")
+
+    def read_info(source, layer):
+        return {"fields": [*points.columns.drop("geometry"), *(["osm_way_id"] if layer == "multipolygons" else [])]}
+
+    def read_dataframe(source, layer, columns, where):
+        # the amenity values are not filtered: a superset of the POIs
+        return points if layer == "points" else points.iloc[:0].assign(osm_way_id=None)
+    monkeypatch.setattr(poi_store.pyogrio, "read_info", read_info)
+    monkeypatch.setattr(poi_store.pyogrio, "read_dataframe", read_dataframe)
+    return points
+
+
+def expected_ids(points: GeoDataFrame, bbox: list[float], values: list[str]) -> list[tuple[str, int]]:
+    inside = points.cx[bbox[0]:bbox[2], bbox[1]:bbox[3]]
+    return sorted(("node", int(osm_id)) for osm_id in inside[inside["amenity"].isin(values)]["osm_id"])
+
+
+@pytest.mark.parametrize("bbox", [[6.55, 46.55, 6.56, 46.63], [6.5, 46.5, 6.7, 46.7], [6.61, 46.6, 6.62, 46.601],
+                                  [7.0, 47.0, 7.1, 47.1]])
+def test_query(extract, tmp_path, bbox):
+    path = str(tmp_path / "extract.osm.pbf.pois.arrow")
+    ingest("extract.osm.pbf", path, TAGS)
+    store = PoiStore(path)
+    assert store.band_height == poi_store.BAND_HEIGHT
+    pois = store.query(bbox, {"amenity": ["pharmacy"]})
+    # indexed as the features of get_osm_features
+    assert pois.index.names == ["element", "id"]
+    assert sorted(pois.index) == expected_ids(extract, bbox, ["pharmacy"])
+    assert set(pois["amenity"]) <= {"pharmacy"}
+
+
+def test_query_store_sorted_by_longitude(extract, tmp_path):
+    path = str(tmp_path / "extract.osm.pbf.pois.arrow")
+    ingest("extract.osm.pbf", path, TAGS)
+    table = pa.ipc.open_file(path).read_all()
+    table = table.take(np.argsort(table["x"].to_numpy())).replace_schema_metadata(None)
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    store = PoiStore(path)
+    assert store.band_height is None
+    bbox = [6.55, 46.55, 6.6, 46.6]
+    assert sorted(store.query(bbox, TAGS).index) == expected_ids(extract, bbox, TAGS["amenity"])
+
+
+OSM = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+ <node id="1" lat="46.5" lon="6.5"><tag k="amenity" v="pharmacy"/><tag k="name" v="A"/></node>
+ <node id="2" lat="46.51" lon="6.51"><tag k="amenity" v="bench"/></node>
+ <node id="3" lat="46.52" lon="6.52"><tag k="shop" v="bakery"/><tag k="name" v="O'Pain"/></node>
+ <node id="4" lat="46.5" lon="6.5"/><node id="5" lat="46.5" lon="6.51"/><node id="6" lat="46.51" lon="6.51"/>
+ <way id="10"><nd ref="4"/><nd ref="5"/><nd ref="6"/><nd ref="4"/><tag k="amenity" v="cafe"/></way>
+ <way id="11"><nd ref="4"/><nd ref="6"/><tag k="highway" v="footway"/></way>
+</osm>
+"""
+
+
+def test_ingest_filters_while_reading(tmp_path, monkeypatch):
+    source = tmp_path / "extract.osm"
+    source.write_text(OSM)
+    reads = []
+    read_dataframe = poi_store.pyogrio.read_dataframe
+
+    def read_filtered(*args, **kwargs):
+        reads.append(kwargs)
+        return read_dataframe(*args, **kwargs)
+    monkeypatch.setattr(poi_store.pyogrio, "read_dataframe", read_filtered)
+    ingest(str(source), tags={"amenity": ["pharmacy", "cafe"], "shop": ["bakery"]})
+
+    # only the POIs are read: in a column of their own or in other_tags
+    assert all(kwargs["where"] and "highway" not in kwargs["columns"] for kwargs in reads)
+    pois = PoiStore(poi_store.get_store_path(str(source))).query([6, 46, 7, 47], {"amenity": ["pharmacy", "cafe"],
+                                                                                   "shop": ["bakery"]})
+    assert sorted(pois.index) == [("node", 1), ("node", 3), ("way", 10)]
+    assert pois.loc[("node", 3), "name"] == "O'Pain"
+
+
+def test_store_reopened_when_ingested_again(extract, tmp_path, monkeypatch):
+    pytest.importorskip("isochrones")
+    from api.service import pois as pois_service
+    from api.service.pois import PoisService
+    monkeypatch.setattr(pois_service, "stores", {})
+    source = str(tmp_path / "extract.osm.pbf")
+    ingest(source, tags=TAGS)
+    service = PoisService()
+    store = service._get_store(source)
+    assert service._get_store(source) is store
+
+    ingest(source, tags={"amenity": ["pharmacy"]})
+    os.utime(poi_store.get_store_path(source), ns=(store.mtime + 10**9, store.mtime + 10**9))
+    reopened = service._get_store(source)
+    assert reopened is not store and len(reopened) < len(store)
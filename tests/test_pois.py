@@ -0,0 +1,167 @@
+import asyncio
+import json
+import pandas as pd
+import pytest
+from geopandas import GeoDataFrame
+from shapely.geometry import Point
+
+pytest.importorskip("isochrones")
+
+from api.config import config  # noqa: E402
+from api.service import pois as pois_service  # noqa: E402
+from api.service.pois import PoisService  # noqa: E402
+
+AREAS = [[6.50, 46.50, 6.55, 46.53], [6.80, 46.50, 6.85, 46.53]]
+
+
+@pytest.fixture
+def service(redis, monkeypatch):
+    async def fetch_features(self, bbox, categories, source):
+        center = Point((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
+        index = pd.Index([int(center.x * 1e6)], name="osmid")
+        return GeoDataFrame({"amenity": ["pharmacy"]}, index=index, geometry=[center], crs="EPSG:4326")
+    monkeypatch.setattr(config, "CACHE_OSM_AREAS", json.dumps(AREAS))
+    monkeypatch.setattr(config, "CACHE_OSM_INDEX_CHECK", 0)
+    monkeypatch.setattr(pois_service, "indexes", {})
+    monkeypatch.setattr(PoisService, "_fetch_features", fetch_features)
+    return PoisService()
+
+
+@pytest.mark.anyio
+async def test_writes_reload_only_the_indexes_of_their_area(service):
+    for area in AREAS:
+        await service._make_area_category_cache(area, "health", None)
+    first, second = [await service._get_index(area) for area in AREAS]
+    assert first.covers(["health"]) and second.covers(["health"])
+
+    await service.delete_cache(["health"], bbox=AREAS[0])
+    assert await service._get_index(AREAS[1]) is second
+    assert await service._get_index(AREAS[0]) is not first
+
+    await service._make_area_category_cache(AREAS[0], "health", None)
+    assert await service._get_index(AREAS[1]) is second
+
+    # invalidating the categories everywhere reloads all the indexes
+    await service.delete_cache(["health"])
+    assert await service._get_index(AREAS[1]) is not second
+
+
+@pytest.mark.anyio
+async def test_cached_features_keep_their_ids(service):
+    # read from the cached tiles, then from the index of the area
+    for _ in range(2):
+        features = await service.get_features(AREAS[0], ["health"], cached=True)
+        assert features.index.name == "osmid"
+        assert list(features.index) == [int(features.geometry.x.iloc[0] * 1e6)]
+
+
+@pytest.mark.anyio
+async def test_cache_job_runs_once(service, monkeypatch):
+    fetches = []
+    fetch_features = PoisService._fetch_features
+
+    async def slow_fetch_features(self, bbox, categories, source):
+        fetches.append(categories)
+        await asyncio.sleep(0.01)
+        return await fetch_features(self, bbox, categories, source)
+    monkeypatch.setattr(PoisService, "_fetch_features", slow_fetch_features)
+    monkeypatch.setattr(pois_service, "jobs", {})
+    job = await service.start_cache_job()
+    # resumed while running
+    await service.make_cache(job["job_id"])
+    await asyncio.gather(*pois_service.jobs.values())
+
+    job = await service.get_cache_job(job["job_id"])
+    assert job["status"] == "done" and job["done"] == job["total"]
+    assert len(fetches) == job["total"]
+
+
+@pytest.mark.anyio
+async def test_cache_job_interrupted_on_shutdown(service, redis, monkeypatch):
+    async def hanging_fetch_features(self, bbox, categories, source):
+        await asyncio.sleep(60)
+    monkeypatch.setattr(PoisService, "_fetch_features", hanging_fetch_features)
+    monkeypatch.setattr(pois_service, "jobs", {})
+    job_id = (await service.start_cache_job())["job_id"]
+    await asyncio.sleep(0.05)
+    assert (await service.get_cache_job(job_id))["status"] == "running"
+
+    await pois_service.stop_cache_jobs()
+    assert (await service.get_cache_job(job_id))["status"] == "interrupted"
+    assert not await redis.exists(service._make_job_lock_key(job_id))
+
+
+@pytest.mark.anyio
+async def test_cache_job_of_a_dead_worker_is_interrupted(service, redis, monkeypatch):
+    monkeypatch.setattr(pois_service, "jobs", {})
+    job_id = (await service.start_cache_job())["job_id"]
+    await asyncio.gather(*pois_service.jobs.values())
+    await redis.hset(service._make_job_key(job_id), "status", "running")
+    assert (await service.get_cache_job(job_id))["status"] == "interrupted"
+
+
+async def cache_area(service: PoisService) -> list[str]:
+    """Cache the health tiles of the first area and load its index, returning the tile keys."""
+    await service._make_area_category_cache(AREAS[0], "health", None)
+    assert (await service._get_index(AREAS[0])).covers(["health"])
+    namespace = (await service._get_namespaces(["health"]))["health"]
+    return [service._make_cache_key("health", namespace, tile)
+            for tile in pois_service.bbox_tiles(AREAS[0], config.CACHE_OSM_TILE_ZOOM)]
+
+
+@pytest.mark.anyio
+async def test_stale_tiles_of_an_index_are_refreshed(service, redis, monkeypatch):
+    keys = await cache_area(service)
+    refreshed = []
+
+    async def refresh_tiles_cache(self, tiles, category, namespace, source):
+        refreshed.extend(tiles)
+    monkeypatch.setattr(PoisService, "_refresh_tiles_cache", refresh_tiles_cache)
+    await service.get_features(AREAS[0], ["health"], cached=True)
+    await asyncio.gather(*pois_service.refreshes)
+    assert refreshed == []
+
+    await redis.delete(f"{keys[0]}:fresh")
+    features = await service.get_features(AREAS[0], ["health"], cached=True)
+    await asyncio.gather(*pois_service.refreshes)
+    assert not features.empty
+    assert len(refreshed) == 1
+
+
+@pytest.mark.anyio
+async def test_expired_tiles_are_not_served_from_the_index(service, redis, monkeypatch):
+    keys = await cache_area(service)
+    index = await service._get_index(AREAS[0])
+    # expired, without changing the generation of the area
+    await redis.delete(keys[0])
+    monkeypatch.setattr(index, "query", lambda *args: pytest.fail("served from the index"))
+    await service.get_features(AREAS[0], ["health"], cached=True)
+    assert await redis.exists(keys[0])
+
+
+@pytest.mark.anyio
+async def test_failed_refresh_keeps_its_lease(service, redis, monkeypatch):
+    keys = await cache_area(service)
+
+    async def make_tiles_cache(self, tiles, category, namespace, source):
+        raise ConnectionError("Overpass is down")
+    monkeypatch.setattr(PoisService, "_make_tiles_cache", make_tiles_cache)
+    tiles = pois_service.bbox_tiles(AREAS[0], config.CACHE_OSM_TILE_ZOOM)[:1]
+    await service._refresh_tiles_cache(tiles, "health", 0, None)
+    assert await redis.exists(f"{keys[0]}:refresh")
+
+
+@pytest.mark.anyio
+async def test_refresh_skips_the_tiles_refreshed_by_another_worker(service, redis, monkeypatch):
+    refreshed = []
+
+    async def make_tiles_cache(self, tiles, category, namespace, source):
+        refreshed.extend(tiles)
+        return {}
+    monkeypatch.setattr(PoisService, "_make_tiles_cache", make_tiles_cache)
+    tiles = pois_service.bbox_tiles([6.5, 46.5, 6.7, 46.7], config.CACHE_OSM_TILE_ZOOM)[:3]
+    await redis.set(f"{service._make_cache_key('health', 0, tiles[1])}:refresh", "other")
+    await service._refresh_tiles_cache(tiles, "health", 0, None)
+    assert refreshed == [tiles[0], tiles[2]]
+    # released once refreshed, the lock of the other worker is kept
+    assert [await redis.exists(f"{service._make_cache_key('health', 0, tile)}:refresh") for tile in tiles] == [0, 1, 0]
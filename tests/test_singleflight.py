@@ -0,0 +1,87 @@
+import asyncio
+import pytest
+from api.singleflight import RedisLock, SingleFlight, redis_single_flight
+
+
+@pytest.mark.anyio
+async def test_single_flight_coalesces_calls():
+    calls = []
+    flight = SingleFlight()
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"result": 42}
+    results = await asyncio.gather(*[flight.do("key", compute) for _ in range(5)])
+    assert calls == [1]
+    assert all(result is results[0] for result in results)
+    assert len(flight) == 0
+    await flight.do("key", compute)
+    assert calls == [1, 1]
+
+
+@pytest.mark.anyio
+async def test_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return 42
+    first = asyncio.ensure_future(flight.do("key", compute))
+    second = asyncio.ensure_future(flight.do("key", compute))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == 42
+
+
+@pytest.mark.anyio
+async def test_redis_lock_owned_by_its_holder(redis):
+    lock, other = RedisLock("lock", 10), RedisLock("lock", 10)
+    assert await lock.acquire()
+    assert not await other.acquire()
+    await other.release()
+    assert await lock.locked()
+    assert not await other.extend()
+    assert await lock.extend()
+    await lock.release()
+    assert not await lock.locked()
+    assert await other.acquire()
+
+
+@pytest.mark.anyio
+async def test_redis_single_flight_computes_once(redis):
+    calls = []
+
+    async def get_result():
+        value = await redis.get("result")
+        return int(value) if value else None
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        await redis.set("result", 42)
+        return 42
+    results = await asyncio.gather(*[redis_single_flight("result:lock", get_result, compute, lease=5, timeout=5,
+                                                         poll_interval=0.01) for _ in range(3)])
+    assert results == [42, 42, 42]
+    assert calls == [1]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("distributed", [False, True])
+async def test_identical_isochrone_requests_coalesced(redis, otp, monkeypatch, distributed):
+    from api.config import config
+    from api.models.isochrones import IsochronePoisData
+    from api.service.isochrones import IsochronesService
+
+    async def slow(kwargs):
+        await asyncio.sleep(0.05)
+    otp.before = slow
+    monkeypatch.setattr(config, "ISOCHRONES_SINGLE_FLIGHT_REDIS", distributed)
+    requests = [IsochronePoisData(lon=6.5668, lat=46.5191, cutoffSec=cutoffs, datetime="2025-03-10T08:07:00",
+                                  mode="WALK") for cutoffs in [[300, 600], [600, 300], [300, 600]]]
+    # one service per request, as in the views
+    results = await asyncio.gather(*[IsochronesService().compute(data) for data in requests])
+    assert len(otp.calls) == 1
+    assert all(result == results[0] for result in results)
+    assert results[0]["isochrones"]["features"]